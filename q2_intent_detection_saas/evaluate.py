@@ -13,7 +13,6 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from evaluation.evaluator import Evaluator
-from support_system import CustomerSupportSystem
 
 def main():
     parser = argparse.ArgumentParser(description='Evaluate Customer Support System')
@@ -27,17 +26,26 @@ def main():
                        help='Output directory for results')
     parser.add_argument('--quick', action='store_true',
                        help='Run quick evaluation with fewer queries')
+    parser.add_argument('--summary-from', metavar='RESULTS_FILE',
+                       help='Print the summary of a saved evaluation_results JSON and exit')
     
     args = parser.parse_args()
     
+    if args.summary_from:
+        # Reporting only, so the support system and models are never loaded
+        Evaluator.from_results_file(args.summary_from).print_summary()
+        return
+    
     print("="*60)
     print("CUSTOMER SUPPORT SYSTEM EVALUATION")
     print("="*60)
     
+    # Initialize evaluator
+    evaluator = Evaluator(output_dir=args.output_dir)
+    
     # Check system health first
     print("\nChecking system health...")
-    support_system = CustomerSupportSystem()
-    health = support_system.health_check()
+    health = evaluator.get_system_health()
     
     print(f"System Status: {health['system_status']}")
     print(f"LLM Services: {health['llm_services']}")
@@ -50,9 +58,6 @@ def main():
             print("Evaluation cancelled.")
             return
     
-    # Initialize evaluator
-    evaluator = Evaluator(output_dir=args.output_dir)
-    
     try:
         if args.mode == 'health':
             print("\n" + "="*40)
@@ -3,31 +3,87 @@ Main Evaluator for Customer Support System
 Runs comprehensive evaluation tests and generates reports
 """
 
+import asyncio
 import time
-import json
 import os
-from typing import Dict, List, Any, Optional
+import hashlib
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Optional
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
-from support_system import CustomerSupportSystem
+import numpy as np
+import orjson
+
 from .test_queries import TestQueryGenerator
 from .metrics import MetricsCalculator
 
+if TYPE_CHECKING:
+    from support_system import CustomerSupportSystem
+
 logger = logging.getLogger(__name__)
 
+# numpy values from the metrics layer serialize natively; anything else falls back to str
+_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+@lru_cache(maxsize=None)
+def _shared_support_system(quant: Optional[str] = None) -> "CustomerSupportSystem":
+    """Build the support system once per quantization mode and share it across Evaluator instances"""
+    # Imported here so loading this module (e.g. to print saved results) doesn't load the models
+    from support_system import CustomerSupportSystem
+    return CustomerSupportSystem(quant=quant)
+
 class Evaluator:
     """Main evaluator for the customer support system"""
     
-    def __init__(self, output_dir: str = "./evaluation_results"):
-        self.support_system = CustomerSupportSystem()
+    def __init__(self, output_dir: str = "./evaluation_results", use_cache: bool = True,
+                 batch_size: int = 32, llm_concurrency: int = 20, parallel_backends: bool = True,
+                 local_quant: Optional[str] = None, semantic_cache: bool = False,
+                 semantic_threshold: float = 0.92):
+        self.local_quant = local_quant
+        self.support_system = _shared_support_system(local_quant)
         self.test_generator = TestQueryGenerator()
         self.metrics_calculator = MetricsCalculator()
         self.output_dir = output_dir
         
+        # Exact-match response cache keyed by (mode, query)
+        self.use_cache = use_cache
+        self._cache: Dict[str, tuple] = {}
+        
+        # Optional second tier that reuses answers for near-duplicate queries, per mode
+        self.semantic_cache = semantic_cache
+        self.semantic_threshold = semantic_threshold
+        self._semantic_embeds: Dict[bool, np.ndarray] = {}
+        self._semantic_results: Dict[bool, List[tuple]] = {}
+        self._embedder = self._load_embedder() if semantic_cache else None
+        
+        # Guards writes to the per-query JSONL logs
+        self._raw_lock = Lock()
+        
+        # Number of queries dispatched to the support system per batch
+        self.batch_size = batch_size
+        
+        # Maximum number of direct-LLM requests in flight at once
+        self.llm_concurrency = llm_concurrency
+        
+        # Run the local and OpenAI evaluations side by side; disable when both share one device
+        self.parallel_backends = parallel_backends
+        
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
+        # Every fresh answer is appended here, so an interrupted run can be resumed from the cache
+        suffix = f"_{local_quant}" if local_quant else ""
+        self._jsonl_path = os.path.join(output_dir, f"response_cache{suffix}.jsonl")
+        if use_cache:
+            self._load_cache_file()
+        
+        # Timestamp shared by every artifact written during one run_* call
+        self._run_ts: Optional[str] = None
+        
         # Evaluation results storage
         self.results = {
             'timestamp': datetime.now().isoformat(),
@@ -38,33 +94,36 @@ class Evaluator:
             'summary': {}
         }
     
+    @classmethod
+    def from_results_file(cls, path: str) -> "Evaluator":
+        """Load saved evaluation results for reporting, without building the support system"""
+        evaluator = cls.__new__(cls)
+        evaluator.support_system = None
+        evaluator.metrics_calculator = MetricsCalculator()
+        evaluator.output_dir = os.path.dirname(path) or "."
+        evaluator._run_ts = None
+        
+        with open(path, 'rb') as f:
+            evaluator.results = orjson.loads(f.read())
+        
+        return evaluator
+    
     def run_full_evaluation(self) -> Dict[str, Any]:
         """Run complete evaluation with all test queries"""
         logger.info("Starting full evaluation...")
         
         # Get all test queries
         all_queries = self.test_generator.get_all_test_queries()
-        expected_intents = [self.test_generator.get_expected_intent(q) for q in all_queries]
+        expected_intents = self.test_generator.get_expected_intents(all_queries)
         
         logger.info(f"Testing {len(all_queries)} queries across all intents")
-        
-        # Test with local model (processor-based approach)
-        logger.info("Testing with local model (processor-based)...")
-        local_results = self._evaluate_queries(all_queries, expected_intents, use_llm_direct=False)
-        
-        # Test with OpenAI model (direct LLM approach)
-        logger.info("Testing with OpenAI model (direct LLM)...")
-        openai_results = self._evaluate_queries(all_queries, expected_intents, use_llm_direct=True)
-        
-        # Calculate A/B test metrics
-        logger.info("Calculating A/B test metrics...")
-        ab_test_results = self.metrics_calculator.calculate_ab_test_metrics(local_results, openai_results)
+        run = self._run(all_queries, expected_intents)
         
         # Store results
         self.results['test_queries'] = all_queries
-        self.results['local_results'] = local_results
-        self.results['openai_results'] = openai_results
-        self.results['ab_test_results'] = ab_test_results
+        self.results['local_results'] = run['local_results']
+        self.results['openai_results'] = run['openai_results']
+        self.results['ab_test_results'] = run['ab_test_results']
         
         # Generate summary
         self.results['summary'] = self._generate_summary()
@@ -75,124 +134,421 @@ class Evaluator:
         logger.info("Full evaluation completed")
         return self.results
     
-    def run_intent_evaluation(self, intent: str) -> Dict[str, Any]:
-        """Run evaluation for a specific intent"""
+    def run_intent_evaluation(self, intent: str, compare: bool = True) -> Dict[str, Any]:
+        """Run evaluation for a specific intent; compare=False runs the local model only"""
         logger.info(f"Starting evaluation for intent: {intent}")
         
         queries = self.test_generator.get_queries_by_intent(intent)
-        expected_intents = [intent] * len(queries)
         
         logger.info(f"Testing {len(queries)} queries for {intent} intent")
-        
-        # Test both approaches
-        local_results = self._evaluate_queries(queries, expected_intents, use_llm_direct=False)
-        openai_results = self._evaluate_queries(queries, expected_intents, use_llm_direct=True)
-        
-        # Calculate comparison
-        ab_test_results = self.metrics_calculator.calculate_ab_test_metrics(local_results, openai_results)
-        
-        results = {
-            'intent': intent,
-            'queries': queries,
-            'local_results': local_results,
-            'openai_results': openai_results,
-            'ab_test_results': ab_test_results
-        }
-        
-        # Save intent-specific results
-        self._save_intent_results(intent, results)
-        
-        return results
+        return self._run(queries, [intent] * len(queries), save_tag=intent, compare=compare, intent=intent)
     
     def run_balanced_evaluation(self, samples_per_intent: int = 5) -> Dict[str, Any]:
         """Run evaluation with balanced samples per intent"""
         logger.info(f"Starting balanced evaluation with {samples_per_intent} samples per intent")
         
         balanced_queries = self.test_generator.get_balanced_sample(samples_per_intent)
-        expected_intents = [self.test_generator.get_expected_intent(q) for q in balanced_queries]
+        expected_intents = self.test_generator.get_expected_intents(balanced_queries)
         
         logger.info(f"Testing {len(balanced_queries)} balanced queries")
+        return self._run(balanced_queries, expected_intents, save_tag="balanced")
+    
+    def run_quantization_evaluation(self, quant: str = "int8", samples_per_intent: int = 5) -> Dict[str, Any]:
+        """A/B the local model against its quantized build on a balanced sample"""
+        logger.info(f"Starting quantization evaluation: {self.local_quant or 'default'} vs {quant}")
+        
+        queries = self.test_generator.get_balanced_sample(samples_per_intent)
+        expected_intents = self.test_generator.get_expected_intents(queries)
+        
+        # A separate evaluator keeps the quantized responses out of this evaluator's cache
+        quant_evaluator = Evaluator(
+            output_dir=self.output_dir, use_cache=self.use_cache, batch_size=self.batch_size,
+            llm_concurrency=self.llm_concurrency, local_quant=quant
+        )
         
-        # Test both approaches
-        local_results = self._evaluate_queries(balanced_queries, expected_intents, use_llm_direct=False)
-        openai_results = self._evaluate_queries(balanced_queries, expected_intents, use_llm_direct=True)
+        self._start_run()
+        quant_evaluator._run_ts = self._run_ts
         
-        # Calculate comparison
-        ab_test_results = self.metrics_calculator.calculate_ab_test_metrics(local_results, openai_results)
+        logger.info("Testing with default local model...")
+        base_collected = self._collect_responses(queries, expected_intents, use_llm_direct=False)
         
+        logger.info(f"Testing with {quant} local model...")
+        quant_collected = quant_evaluator._collect_responses(queries, expected_intents, use_llm_direct=False)
+        
+        # Both sides are scored by this evaluator against one shared TF-IDF vocabulary
+        self.metrics_calculator.prefit(queries, base_collected['responses'], quant_collected['responses'])
+        base_results = self._score_responses(queries, expected_intents, base_collected)
+        quant_results = self._score_responses(queries, expected_intents, quant_collected)
+        
+        # In ab_test_results the "local" side is the default model and "openai" the quantized one
         results = {
-            'queries': balanced_queries,
+            'quant': quant,
+            'queries': queries,
             'expected_intents': expected_intents,
-            'local_results': local_results,
-            'openai_results': openai_results,
-            'ab_test_results': ab_test_results
+            'base_results': base_results,
+            'quant_results': quant_results,
+            'ab_test_results': self.metrics_calculator.calculate_ab_test_metrics(base_results, quant_results)
         }
         
-        # Save balanced results
-        self._save_balanced_results(results)
-        
+        self._save_run_results(f"quant_{quant}", results)
         return results
     
-    def _evaluate_queries(self, queries: List[str], expected_intents: List[str], use_llm_direct: bool = False) -> Dict[str, Any]:
-        """Evaluate a list of queries and return metrics"""
+    def run_all(self, samples_per_intent: int = 5) -> Dict[str, Any]:
+        """Run the full, balanced and per-intent evaluations as one suite.
+        
+        Balanced and per-intent query sets are subsets of the full set, so with
+        the response cache enabled only the full sweep reaches the backend.
+        """
+        full_results = self.run_full_evaluation()
+        balanced_results = self.run_balanced_evaluation(samples_per_intent)
+        intent_results = {
+            intent: self.run_intent_evaluation(intent)
+            for intent in self.test_generator.test_queries
+        }
         
-        predicted_intents = []
-        responses = []
-        response_times = []
-        token_usage = []
+        return {
+            'full': full_results,
+            'balanced': balanced_results,
+            'intents': intent_results
+        }
+    
+    def _run(self, queries: List[str], expected_intents: List[str], save_tag: Optional[str] = None,
+             compare: bool = True, **metadata) -> Dict[str, Any]:
+        """Evaluate queries on both backends, compare them, and optionally save the results"""
+        self._start_run()
+        
+        if compare and self.parallel_backends:
+            # Only the backend calls overlap; the shared MetricsCalculator is not thread-safe,
+            # so both sides are scored afterwards on this thread
+            logger.info("Testing with local model (processor-based) and OpenAI model (direct LLM) in parallel...")
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                local_future = executor.submit(self._collect_responses, queries, expected_intents, False)
+                openai_future = executor.submit(self._collect_responses, queries, expected_intents, True)
+                local_collected, openai_collected = local_future.result(), openai_future.result()
+        else:
+            # Test with local model (processor-based approach)
+            logger.info("Testing with local model (processor-based)...")
+            local_collected = self._collect_responses(queries, expected_intents, use_llm_direct=False)
+            
+            if compare:
+                # Test with OpenAI model (direct LLM approach)
+                logger.info("Testing with OpenAI model (direct LLM)...")
+                openai_collected = self._collect_responses(queries, expected_intents, use_llm_direct=True)
+        
+        if compare:
+            # One TF-IDF vocabulary for both sides, so their relevance scores are comparable
+            self.metrics_calculator.prefit(queries, local_collected['responses'], openai_collected['responses'])
+        
+        local_results = self._score_responses(queries, expected_intents, local_collected)
+        if compare:
+            openai_results = self._score_responses(queries, expected_intents, openai_collected)
         
-        logger.info(f"Processing {len(queries)} queries with {'direct LLM' if use_llm_direct else 'processor-based'} approach")
+        results = {
+            **metadata,
+            'queries': queries,
+            'expected_intents': expected_intents,
+            'local_results': local_results
+        }
         
-        for i, query in enumerate(queries):
-            try:
-                start_time = time.time()
-                
-                if use_llm_direct:
-                    result = self.support_system.process_query_with_llm(query)
+        if compare:
+            # Calculate A/B test metrics
+            logger.info("Calculating A/B test metrics...")
+            results['openai_results'] = openai_results
+            results['ab_test_results'] = self.metrics_calculator.calculate_ab_test_metrics(
+                local_results, openai_results
+            )
+        
+        if save_tag:
+            self._save_run_results(save_tag, results)
+        
+        return results
+    
+    def _start_run(self):
+        """Fix the timestamp used to name this run's output files"""
+        self._run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    def _evaluate_queries(self, queries: List[str], expected_intents: List[str], use_llm_direct: bool = False) -> Dict[str, Any]:
+        """Evaluate a list of queries and return metrics"""
+        return self._score_responses(
+            queries, expected_intents, self._collect_responses(queries, expected_intents, use_llm_direct)
+        )
+    
+    def _collect_responses(self, queries: List[str], expected_intents: List[str], use_llm_direct: bool = False) -> Dict[str, Any]:
+        """Answer a list of queries from the caches or the backend, without scoring them"""
+        
+        n = len(queries)
+        predicted_intents = [None] * n
+        responses = [None] * n
+        response_times = np.zeros(n, dtype=np.float32)
+        token_usage = np.zeros(n, dtype=np.int32)
+        cache_hits = np.zeros(n, dtype=bool)
+        valid = np.ones(n, dtype=bool)
+        
+        logger.info(f"Processing {n} queries with {'direct LLM' if use_llm_direct else 'processor-based'} approach")
+        
+        # Per-query records are streamed to disk as they complete instead of kept in memory
+        mode = 'llm' if use_llm_direct else 'processor'
+        if self.local_quant:
+            mode = f"{mode}_{self.local_quant}"
+        if self._run_ts is None:
+            self._start_run()
+        raw_path = os.path.join(self.output_dir, f"raw_{mode}_{self._run_ts}.jsonl")
+        
+        with open(raw_path, 'ab') as raw_file:
+            def log_record(i: int):
+                self._write_raw_record(raw_file, {
+                    'q': queries[i],
+                    'expected': expected_intents[i],
+                    'pred': predicted_intents[i],
+                    'response': responses[i],
+                    'dt': float(response_times[i]),
+                    'tok': int(token_usage[i]),
+                    'cached': bool(cache_hits[i])
+                })
+            
+            # Serve cache hits first, so only misses are sent to the backend
+            pending = []
+            for i, query in enumerate(queries):
+                cached = self._cache.get(self._cache_key(query, use_llm_direct)) if self.use_cache else None
+                if cached:
+                    predicted_intents[i], responses[i], token_usage[i] = cached
+                    cache_hits[i] = True
+                    log_record(i)
                 else:
-                    result = self.support_system.process_query(query)
-                
-                response_time = time.time() - start_time
-                
-                predicted_intents.append(result.intent.intent)
-                responses.append(result.response)
-                response_times.append(response_time)
-                token_usage.append(result.tokens_used)
-                
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Processed {i + 1}/{len(queries)} queries")
+                    pending.append(i)
+            
+            # Near-duplicates of queries answered earlier are served from the semantic cache
+            pending_embeds = {}
+            if self.semantic_cache and pending:
+                hits, embeds = self._semantic_lookup([queries[i] for i in pending], use_llm_direct)
+                still_pending = []
+                for i, emb, hit in zip(pending, embeds, hits):
+                    if hit is not None:
+                        predicted_intents[i], responses[i], token_usage[i] = hit
+                        cache_hits[i] = True
+                        log_record(i)
+                    else:
+                        pending_embeds[i] = emb
+                        still_pending.append(i)
+                pending = still_pending
+            
+            # Fresh backend answers, added to the semantic index once this pass finishes
+            new_embeds, new_entries = [], []
+            
+            # Group similar-length queries into the same batch; results are written back by index
+            pending.sort(key=lambda i: len(queries[i]))
+            
+            def record_result(i: int, result: Any, response_time: float):
+                if isinstance(result, Exception):
+                    logger.error(f"Error processing query '{queries[i]}': {result}")
+                    # Add fallback values
+                    predicted_intents[i] = "technical"
+                    responses[i] = "Error processing query"
+                    response_times[i] = 30.0  # Penalty time
+                    token_usage[i] = 0
+                    valid[i] = False
+                else:
+                    predicted_intents[i] = result.intent.intent
+                    responses[i] = result.response
+                    response_times[i] = response_time
+                    token_usage[i] = result.tokens_used
+                    
+                    # A failed answer must not be replayed by later runs as if it were real
+                    if self._is_failed_result(result, use_llm_direct):
+                        logger.error(f"Query '{queries[i]}' was not answered normally (processor: {result.processor_used}, model: {result.model_used})")
+                        if result.processor_used == "error":
+                            valid[i] = False  # The apology text says nothing about the query
+                        log_record(i)
+                        return
+                    
+                    entry = (result.intent.intent, result.response, result.tokens_used)
+                    if self.use_cache:
+                        self._cache[self._cache_key(queries[i], use_llm_direct)] = entry
+                        self._append_cache_record(queries[i], use_llm_direct, entry)
+                    if i in pending_embeds:
+                        new_embeds.append(pending_embeds[i])
+                        new_entries.append(entry)
                 
-            except Exception as e:
-                logger.error(f"Error processing query '{query}': {e}")
-                # Add fallback values
-                predicted_intents.append("technical")
-                responses.append("Error processing query")
-                response_times.append(30.0)  # Penalty time
-                token_usage.append(0)
+                log_record(i)
+            
+            if use_llm_direct:
+                asyncio.run(self._dispatch_llm_async(queries, pending, record_result))
+            else:
+                self._dispatch_batches(queries, pending, record_result)
+        
+        if new_entries:
+            self._semantic_add(use_llm_direct, np.stack(new_embeds), new_entries)
+        
+        return {
+            'predicted_intents': predicted_intents,
+            'responses': responses,
+            'response_times': response_times,
+            'token_usage': token_usage,
+            'cache_hits': cache_hits,
+            'valid': valid,
+            'raw_data_file': raw_path
+        }
+    
+    def _score_responses(self, queries: List[str], expected_intents: List[str], collected: Dict[str, Any]) -> Dict[str, Any]:
+        """Calculate the metrics for responses gathered by _collect_responses"""
+        n = len(queries)
+        cache_hits = collected['cache_hits']
         
         # Calculate metrics
-        intent_accuracy = self.metrics_calculator.calculate_intent_accuracy(expected_intents, predicted_intents)
-        response_relevance = self.metrics_calculator.calculate_response_relevance(queries, responses, expected_intents)
-        context_utilization = self.metrics_calculator.calculate_context_utilization(responses, expected_intents)
-        response_quality = self.metrics_calculator.calculate_response_quality_metrics(responses)
-        performance_metrics = self.metrics_calculator.calculate_performance_metrics(response_times, token_usage)
+        metrics = self.metrics_calculator.calculate_all(
+            queries, collected['responses'], expected_intents, collected['predicted_intents'],
+            collected['response_times'], collected['token_usage'],
+            valid=collected['valid'], cache_hits=cache_hits
+        )
+        
+        hits = int(cache_hits.sum())
         
         return {
-            'intent_accuracy': intent_accuracy,
-            'response_relevance': response_relevance,
-            'context_utilization': context_utilization,
-            'response_quality': response_quality,
-            'performance_metrics': performance_metrics,
-            'raw_data': {
-                'queries': queries,
-                'expected_intents': expected_intents,
-                'predicted_intents': predicted_intents,
-                'responses': responses,
-                'response_times': response_times,
-                'token_usage': token_usage
-            }
+            **metrics,
+            'cache_stats': {
+                'hits': hits,
+                'misses': n - hits,
+                'hit_rate': hits / n if n else 0.0
+            },
+            'raw_data_file': collected['raw_data_file']
         }
     
+    def _dispatch_batches(self, queries: List[str], pending: List[int], record_result: Callable,
+                          max_workers: int = 8):
+        """Send pending queries to the processor pipeline in thread-pooled batches"""
+        
+        def run_one(i: int):
+            # Timed per query so latencies compare like-for-like with the async LLM path
+            start_time = time.perf_counter()
+            try:
+                result = self.support_system.process_query(queries[i])
+            except Exception as e:
+                result = e
+            return i, result, time.perf_counter() - start_time
+        
+        processed = 0
+        pending_iter = iter(pending)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                batch = list(islice(pending_iter, self.batch_size))
+                if not batch:
+                    break
+                
+                for i, result, response_time in executor.map(run_one, batch):
+                    record_result(i, result, response_time)
+                
+                processed += len(batch)
+                logger.info(f"Processed {processed}/{len(pending)} queries")
+    
+    async def _dispatch_llm_async(self, queries: List[str], pending: List[int], record_result: Callable):
+        """Send pending queries to the direct-LLM pipeline concurrently on one event loop"""
+        semaphore = asyncio.Semaphore(self.llm_concurrency)
+        processed = 0
+        
+        async def run_one(i: int):
+            nonlocal processed
+            async with semaphore:
+                start_time = time.perf_counter()
+                try:
+                    result = await self.support_system.aprocess_query_with_llm(queries[i])
+                except Exception as e:
+                    result = e
+                record_result(i, result, time.perf_counter() - start_time)
+            
+            processed += 1
+            if processed % self.batch_size == 0 or processed == len(pending):
+                logger.info(f"Processed {processed}/{len(pending)} queries")
+        
+        await asyncio.gather(*(run_one(i) for i in pending))
+    
+    @staticmethod
+    def _is_failed_result(result: Any, use_llm_direct: bool) -> bool:
+        """Check whether a support response is an error or a fallback instead of a real answer"""
+        if result.processor_used == "error":
+            return True
+        # The direct-LLM path falls back to the processors when the LLM call fails
+        return use_llm_direct and result.model_used == "processor"
+    
+    def _write_raw_record(self, raw_file, record: Dict[str, Any]):
+        """Append one per-query record to a raw results JSONL file"""
+        line = orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY, default=str) + b"\n"
+        with self._raw_lock:
+            raw_file.write(line)
+    
+    @staticmethod
+    def _load_embedder():
+        """Load the sentence embedding model used by the semantic cache"""
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(os.getenv("SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2"))
+    
+    def _semantic_lookup(self, queries: List[str], use_llm_direct: bool):
+        """Embed queries and return the closest cached answer above threshold for each, or None"""
+        embeds = self._embedder.encode(queries, normalize_embeddings=True).astype(np.float32)
+        cached = self._semantic_embeds.get(use_llm_direct)
+        if cached is None:
+            return [None] * len(queries), embeds
+        
+        # Embeddings are unit-normalized, so the dot product is the cosine similarity
+        sims = embeds @ cached.T
+        best = sims.argmax(axis=1)
+        entries = self._semantic_results[use_llm_direct]
+        hits = [
+            entries[j] if sims[row, j] >= self.semantic_threshold else None
+            for row, j in enumerate(best)
+        ]
+        return hits, embeds
+    
+    def _semantic_add(self, use_llm_direct: bool, embeds: np.ndarray, entries: List[tuple]):
+        """Index freshly answered queries in the semantic cache"""
+        cached = self._semantic_embeds.get(use_llm_direct)
+        self._semantic_embeds[use_llm_direct] = embeds if cached is None else np.vstack([cached, embeds])
+        self._semantic_results.setdefault(use_llm_direct, []).extend(entries)
+    
+    def _append_cache_record(self, query: str, use_llm_direct: bool, entry: tuple):
+        """Persist one successful answer to the append-only response cache file"""
+        intent, response, tokens = entry
+        line = orjson.dumps({
+            'direct': use_llm_direct,
+            'q': query,
+            'pred': intent,
+            'response': response,
+            'tok': tokens
+        }, default=str) + b"\n"
+        with self._raw_lock:
+            with open(self._jsonl_path, 'ab') as f:
+                f.write(line)
+    
+    def _load_cache_file(self):
+        """Seed the response cache from answers persisted by earlier runs"""
+        if not os.path.exists(self._jsonl_path):
+            return
+        
+        # The support system is already built by now, so this import loads nothing new
+        from support_system import ERROR_RESPONSE
+        
+        loaded = skipped = 0
+        with open(self._jsonl_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Partial line left by an interrupted write
+                if record['response'] == ERROR_RESPONSE:
+                    skipped += 1  # Failure persisted by an older run; ask the backend again
+                    continue
+                self._cache[self._cache_key(record['q'], record['direct'])] = (
+                    record['pred'], record['response'], record['tok']
+                )
+                loaded += 1
+        
+        logger.info(f"Loaded {loaded} cached responses from {self._jsonl_path}"
+                    + (f", skipped {skipped} failed ones" if skipped else ""))
+    
+    @staticmethod
+    def _cache_key(query: str, use_llm_direct: bool) -> str:
+        """Build the exact-match cache key for a query under a given mode"""
+        return hashlib.sha256(f"{use_llm_direct}\0{query}".encode()).hexdigest()
+    
     def _generate_summary(self) -> Dict[str, Any]:
         """Generate evaluation summary"""
         local_results = self.results['local_results']
@@ -215,6 +571,10 @@ class Evaluator:
                 'openai_avg_time': openai_results.get('performance_metrics', {}).get('avg_response_time', 0),
                 'speed_improvement': ab_test.get('performance_comparison', {}).get('speed_improvement', 0)
             },
+            'cache_hit_rate': {
+                'local': local_results.get('cache_stats', {}).get('hit_rate', 0),
+                'openai': openai_results.get('cache_stats', {}).get('hit_rate', 0)
+            },
             'ab_test_winner': ab_test.get('winner', 'unknown'),
             'recommendations': self._generate_recommendations()
         }
@@ -244,6 +604,14 @@ class Evaluator:
         if local_time > 10:
             recommendations.append("Local model response time is high - consider model optimization or caching")
         
+        # Cache recommendations
+        if self.use_cache:
+            stats = [r.get('cache_stats', {}) for r in (local_results, openai_results)]
+            lookups = sum(st.get('hits', 0) + st.get('misses', 0) for st in stats)
+            hit_rate = sum(st.get('hits', 0) for st in stats) / lookups if lookups else 0
+            if hit_rate < 0.05:
+                recommendations.append(f"Cache hit rate is {hit_rate:.1%} - response caching is not helping this workload")
+        
         # Relevance recommendations
         local_rel = local_results.get('response_relevance', {}).get('overall_mean_relevance', 0)
         if local_rel < 0.5:
@@ -259,12 +627,12 @@ class Evaluator:
     
     def _save_results(self):
         """Save evaluation results to files"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = self._run_ts
         
         # Save full results
         results_file = os.path.join(self.output_dir, f"evaluation_results_{timestamp}.json")
-        with open(results_file, 'w') as f:
-            json.dump(self.results, f, indent=2, default=str)
+        with open(results_file, 'wb') as f:
+            f.write(orjson.dumps(self.results, option=_JSON_OPTIONS, default=str))
         
         # Generate and save report
         report = self.metrics_calculator.generate_evaluation_report(self.results)
@@ -274,31 +642,26 @@ class Evaluator:
         
         # Save summary
         summary_file = os.path.join(self.output_dir, f"evaluation_summary_{timestamp}.json")
-        with open(summary_file, 'w') as f:
-            json.dump(self.results['summary'], f, indent=2)
+        with open(summary_file, 'wb') as f:
+            f.write(orjson.dumps(self.results['summary'], option=_JSON_OPTIONS, default=str))
         
         logger.info(f"Results saved to {self.output_dir}")
         logger.info(f"Files created: {results_file}, {report_file}, {summary_file}")
     
-    def _save_intent_results(self, intent: str, results: Dict[str, Any]):
-        """Save intent-specific results"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(self.output_dir, f"{intent}_evaluation_{timestamp}.json")
+    def _save_run_results(self, tag: str, results: Dict[str, Any]):
+        """Save intent-specific or balanced evaluation results"""
+        timestamp = self._run_ts
+        filename = os.path.join(self.output_dir, f"{tag}_evaluation_{timestamp}.json")
         
-        with open(filename, 'w') as f:
-            json.dump(results, f, indent=2, default=str)
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(results, option=_JSON_OPTIONS, default=str))
         
-        logger.info(f"Intent results saved to {filename}")
+        logger.info(f"{tag.capitalize()} results saved to {filename}")
     
-    def _save_balanced_results(self, results: Dict[str, Any]):
-        """Save balanced evaluation results"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(self.output_dir, f"balanced_evaluation_{timestamp}.json")
-        
-        with open(filename, 'w') as f:
-            json.dump(results, f, indent=2, default=str)
-        
-        logger.info(f"Balanced results saved to {filename}")
+    @staticmethod
+    def reset_backend():
+        """Drop the shared support system so the next Evaluator builds a fresh one"""
+        _shared_support_system.cache_clear()
     
     def get_system_health(self) -> Dict[str, Any]:
         """Get system health before evaluation"""
@@ -332,6 +695,11 @@ class Evaluator:
         print(f"  OpenAI Model: {summary['performance']['openai_avg_time']:.3f}s")
         print(f"  Speed Improvement: {summary['performance']['speed_improvement']:.2f}x")
         
+        cache_hit_rate = summary.get('cache_hit_rate', {})
+        print(f"\nCache Hit Rate:")
+        print(f"  Local Model: {cache_hit_rate.get('local', 0):.1%}")
+        print(f"  OpenAI Model: {cache_hit_rate.get('openai', 0):.1%}")
+        
         print(f"\nA/B Test Winner: {summary['ab_test_winner'].upper()}")
         
         print(f"\nRecommendations:")
@@ -4,11 +4,29 @@ Calculates intent accuracy, response relevance, context utilization, and other m
 """
 
 import numpy as np
-from typing import Dict, List, Tuple, Any
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support, confusion_matrix
+from typing import Dict, List, Tuple, Any, Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from scipy.sparse import csr_matrix
+import io
 import re
+import hashlib
+from functools import lru_cache
+
+INTENT_LABELS = ('technical', 'billing', 'feature')
+
+_WORD_RE = re.compile(r'\w+')
+
+# Formatting markers: bold/bullets, dashes and numbered steps
+_STRUCTURE_RE = re.compile(r'\*|-|[123]\.')
+
+# One match per non-blank '.'-separated sentence
+_SENTENCE_RE = re.compile(r'[^.\s][^.]*')
+
+@lru_cache(maxsize=4096)
+def _word_set(text: str) -> frozenset:
+    """Word set of an already-lowercased text, memoized since queries repeat across runs"""
+    return frozenset(_WORD_RE.findall(text))
 
 class MetricsCalculator:
     """Calculator for various evaluation metrics"""
@@ -20,6 +38,16 @@ class MetricsCalculator:
             ngram_range=(1, 2)
         )
         
+        # Lowercased copies of the most recent text lists, shared by the metrics that scan them
+        self._lowered_cache: List[Tuple[List[str], List[str]]] = []
+        
+        # Last fitted corpus, so re-scoring identical texts skips the refit
+        self._fit_signature = None
+        self._tfidf_matrix = None
+        
+        # Shared-vocabulary fit over queries and several models' responses, set by prefit()
+        self._prefit: Optional[Dict[str, Any]] = None
+        
         # Expected response patterns for each intent
         self.expected_patterns = {
             "technical": [
@@ -35,24 +63,42 @@ class MetricsCalculator:
                 "portal", "planned", "future", "enhancement", "improvement"
             ]
         }
+        
+        # One alternation per intent; the lookahead also reports patterns that overlap each other
+        self._intent_regex = {
+            intent: re.compile('(?=(' + '|'.join(map(re.escape, patterns)) + '))')
+            for intent, patterns in self.expected_patterns.items()
+        }
     
     def calculate_intent_accuracy(self, expected_intents: List[str], predicted_intents: List[str]) -> Dict[str, float]:
         """Calculate intent classification accuracy metrics"""
         
-        # Overall accuracy
-        accuracy = accuracy_score(expected_intents, predicted_intents)
+        # Encode labels as ints; labels outside the three intents get extra ids past the end
+        label_ids = {label: i for i, label in enumerate(INTENT_LABELS)}
+        y_true = np.fromiter((label_ids.setdefault(x, len(label_ids)) for x in expected_intents), dtype=np.int64)
+        y_pred = np.fromiter((label_ids.setdefault(x, len(label_ids)) for x in predicted_intents), dtype=np.int64)
         
-        # Per-class metrics
-        precision, recall, f1, support = precision_recall_fscore_support(
-            expected_intents, predicted_intents, average=None, labels=['technical', 'billing', 'feature']
-        )
+        # Confusion matrix over every label seen; the reported one covers the three intents
+        n_labels = len(label_ids)
+        full_cm = np.zeros((n_labels, n_labels), dtype=np.int64)
+        np.add.at(full_cm, (y_true, y_pred), 1)
+        cm = full_cm[:3, :3]
         
-        # Confusion matrix
-        cm = confusion_matrix(expected_intents, predicted_intents, labels=['technical', 'billing', 'feature'])
+        # Overall accuracy
+        accuracy = full_cm.trace() / y_true.size if y_true.size else 0.0
+        
+        # Per-class metrics, 0 where a class was never predicted or never expected
+        tp = cm.diagonal().astype(float)
+        predicted_counts = full_cm[:, :3].sum(axis=0)
+        support = full_cm[:3].sum(axis=1)
+        precision = tp / np.maximum(predicted_counts, 1)
+        recall = tp / np.maximum(support, 1)
+        f1 = np.divide(2 * precision * recall, precision + recall,
+                       out=np.zeros(3), where=(precision + recall) > 0)
         
         # Per-intent accuracy
         intent_accuracy = {}
-        for i, intent in enumerate(['technical', 'billing', 'feature']):
+        for i, intent in enumerate(INTENT_LABELS):
             intent_accuracy[intent] = {
                 'precision': precision[i],
                 'recall': recall[i],
@@ -72,77 +118,115 @@ class MetricsCalculator:
     def calculate_response_relevance(self, queries: List[str], responses: List[str], expected_intents: List[str]) -> Dict[str, float]:
         """Calculate response relevance using cosine similarity"""
         
-        # Combine queries and responses for vectorization
-        combined_texts = queries + responses
-        
-        # Fit and transform
         try:
-            tfidf_matrix = self.vectorizer.fit_transform(combined_texts)
-            
-            # Split back into queries and responses
-            n_queries = len(queries)
-            query_vectors = tfidf_matrix[:n_queries]
-            response_vectors = tfidf_matrix[n_queries:]
+            vectors = self._prefit_vectors(queries, responses)
+            if vectors:
+                query_vectors, response_vectors = vectors
+            else:
+                # Combine queries and responses for vectorization
+                tfidf_matrix = self._fit_transform(queries + responses)
+                
+                # Split back into queries and responses
+                n_queries = len(queries)
+                query_vectors = tfidf_matrix[:n_queries]
+                response_vectors = tfidf_matrix[n_queries:]
             
-            # Calculate cosine similarity
-            similarities = []
-            for i in range(len(queries)):
-                similarity = cosine_similarity(query_vectors[i:i+1], response_vectors[i:i+1])[0][0]
-                similarities.append(similarity)
+            # Cosine similarity of each query/response pair: row-wise dot product of unit vectors
+            similarities = np.asarray(query_vectors.multiply(response_vectors).sum(axis=1)).ravel()
             
             # Calculate relevance by intent
-            intent_relevance = {}
-            for intent in ['technical', 'billing', 'feature']:
-                intent_indices = [i for i, exp_intent in enumerate(expected_intents) if exp_intent == intent]
-                if intent_indices:
-                    intent_similarities = [similarities[i] for i in intent_indices]
-                    intent_relevance[intent] = {
-                        'mean': np.mean(intent_similarities),
-                        'std': np.std(intent_similarities),
-                        'min': np.min(intent_similarities),
-                        'max': np.max(intent_similarities)
-                    }
+            intent_relevance = {
+                intent: self._summary_stats(similarities[rows])
+                for intent, rows in self._intent_groups(expected_intents).items()
+            }
             
             return {
                 'overall_mean_relevance': np.mean(similarities),
                 'overall_std_relevance': np.std(similarities),
                 'per_intent_relevance': intent_relevance,
-                'individual_similarities': similarities
+                'individual_similarities': similarities.tolist()
             }
             
         except Exception as e:
             # Fallback to simple word overlap
             return self._calculate_word_overlap_relevance(queries, responses, expected_intents)
     
+    def prefit(self, queries: List[str], *response_sets: List[str]):
+        """Fit TF-IDF once on the queries plus every model's responses to them.
+        
+        Later relevance calls whose query/response pairs all come from one of
+        these response lists (in any order or subset) slice the shared matrix
+        instead of refitting, and all models are scored against the same vocabulary.
+        """
+        texts = list(queries)
+        pair_rows = []
+        for responses in response_sets:
+            offset = len(texts)
+            pair_rows.append({
+                (query, response): (row, offset + row)
+                for row, (query, response) in enumerate(zip(queries, responses))
+            })
+            texts.extend(responses)
+        
+        self._prefit = {
+            'pair_rows': pair_rows,
+            'matrix': normalize(self.vectorizer.fit_transform(texts), norm='l2', copy=False)
+        }
+    
+    def _prefit_vectors(self, queries: List[str], responses: List[str]):
+        """Query and response rows from the prefit matrix, or None if these pairs weren't prefit"""
+        prefit = self._prefit
+        if prefit is None or not queries:
+            return None
+        
+        pairs = list(zip(queries, responses))
+        for pair_rows in prefit['pair_rows']:
+            if all(pair in pair_rows for pair in pairs):
+                query_rows, response_rows = zip(*(pair_rows[pair] for pair in pairs))
+                matrix = prefit['matrix']
+                return matrix[list(query_rows)], matrix[list(response_rows)]
+        return None
+    
+    def _fit_transform(self, texts: List[str]):
+        """Fit the TF-IDF vectorizer on texts (L2-normalized rows), reusing the previous fit if the corpus is unchanged"""
+        digest = hashlib.blake2b(digest_size=16)
+        for text in texts:
+            digest.update(text.encode())
+            digest.update(b"\0")
+        signature = (len(texts), digest.digest())
+        
+        if signature != self._fit_signature:
+            # Unit rows, normalized in place so cosine similarity is a plain dot product
+            self._tfidf_matrix = normalize(self.vectorizer.fit_transform(texts), norm='l2', copy=False)
+            self._fit_signature = signature
+        return self._tfidf_matrix
+    
     def _calculate_word_overlap_relevance(self, queries: List[str], responses: List[str], expected_intents: List[str]) -> Dict[str, float]:
         """Fallback relevance calculation using word overlap"""
         
-        similarities = []
-        for query, response in zip(queries, responses):
-            query_words = set(re.findall(r'\w+', query.lower()))
-            response_words = set(re.findall(r'\w+', response.lower()))
-            
-            if query_words and response_words:
-                overlap = len(query_words.intersection(response_words))
-                union = len(query_words.union(response_words))
-                similarity = overlap / union if union > 0 else 0
-            else:
-                similarity = 0
-            
-            similarities.append(similarity)
+        # Intern words to column ids so each side becomes a binary (texts x vocabulary) matrix
+        vocabulary = {}
+        query_rows = self._word_rows(self._prepare(queries), vocabulary)
+        response_rows = self._word_rows(self._prepare(responses), vocabulary)
+        shape = (len(queries), max(len(vocabulary), 1))
+        query_matrix = csr_matrix(query_rows, shape=shape)
+        response_matrix = csr_matrix(response_rows, shape=shape)
+        
+        # Jaccard similarity: |Q & R| / |Q | R|, and 0 when either side has no words
+        overlap = np.asarray(query_matrix.multiply(response_matrix).sum(axis=1)).ravel()
+        query_sizes = np.diff(query_matrix.indptr)
+        response_sizes = np.diff(response_matrix.indptr)
+        union = query_sizes + response_sizes - overlap
+        similarities = np.where(
+            (query_sizes > 0) & (response_sizes > 0), overlap / np.maximum(union, 1), 0.0
+        ).tolist()
         
         # Calculate relevance by intent
-        intent_relevance = {}
-        for intent in ['technical', 'billing', 'feature']:
-            intent_indices = [i for i, exp_intent in enumerate(expected_intents) if exp_intent == intent]
-            if intent_indices:
-                intent_similarities = [similarities[i] for i in intent_indices]
-                intent_relevance[intent] = {
-                    'mean': np.mean(intent_similarities),
-                    'std': np.std(intent_similarities),
-                    'min': np.min(intent_similarities),
-                    'max': np.max(intent_similarities)
-                }
+        similarity_array = np.asarray(similarities, dtype=float)
+        intent_relevance = {
+            intent: self._summary_stats(similarity_array[rows])
+            for intent, rows in self._intent_groups(expected_intents).items()
+        }
         
         return {
             'overall_mean_relevance': np.mean(similarities),
@@ -152,124 +236,293 @@ class MetricsCalculator:
             'method': 'word_overlap'
         }
     
+    def _prepare(self, texts: List[str]) -> List[str]:
+        """Lowercase a list of texts once, reusing the result while the same list object is scored"""
+        for cached_texts, lowered in self._lowered_cache:
+            if cached_texts is texts:
+                return lowered
+        
+        lowered = [text.lower() for text in texts]
+        # Keep the current queries and responses; holding the list also pins its identity
+        self._lowered_cache = [(texts, lowered)] + self._lowered_cache[:1]
+        return lowered
+    
+    @staticmethod
+    def _dedupe(texts) -> Tuple[List[str], np.ndarray]:
+        """Distinct texts in first-seen order, plus each input's index into them"""
+        first_seen: Dict[str, int] = {}
+        inverse = [first_seen.setdefault(text, len(first_seen)) for text in texts]
+        return list(first_seen), np.asarray(inverse, dtype=np.int64)
+    
+    @staticmethod
+    def _word_rows(texts: List[str], vocabulary: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """CSR (data, indices, indptr) of each lowercased text's word set, adding new words to vocabulary"""
+        indices = []
+        indptr = [0]
+        for text in texts:
+            indices.extend(vocabulary.setdefault(word, len(vocabulary)) for word in _word_set(text))
+            indptr.append(len(indices))
+        return np.ones(len(indices)), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)
+    
     def calculate_context_utilization(self, responses: List[str], expected_intents: List[str]) -> Dict[str, float]:
         """Calculate how well responses utilize context for each intent"""
         
-        utilization_scores = []
-        intent_utilization = {'technical': [], 'billing': [], 'feature': []}
+        n = len(responses)
+        responses_lower = self._prepare(responses)
+        utilization_scores = np.zeros(n)
+        per_intent_utilization = {}
         
-        for response, expected_intent in zip(responses, expected_intents):
-            # Check for expected patterns in response
-            expected_patterns = self.expected_patterns.get(expected_intent, [])
-            response_lower = response.lower()
+        # Score each intent's responses together as one (responses x patterns) hit matrix
+        for intent, rows in self._intent_groups(expected_intents).items():
+            patterns = self.expected_patterns[intent]
+            column = {pattern: j for j, pattern in enumerate(patterns)}
             
-            # Count how many expected patterns are present
-            pattern_matches = sum(1 for pattern in expected_patterns if pattern in response_lower)
+            # Repeated responses (e.g. boilerplate fallbacks) are scanned once
+            unique_texts, inverse = self._dedupe(responses_lower[i] for i in rows)
+            hits = np.zeros((len(unique_texts), len(patterns)), dtype=bool)
+            intent_regex = self._intent_regex[intent]
+            for r, text in enumerate(unique_texts):
+                found = 0
+                for match in intent_regex.finditer(text):
+                    j = column[match.group(1)]
+                    if not hits[r, j]:
+                        hits[r, j] = True
+                        found += 1
+                        if found == len(patterns):
+                            break  # Every pattern seen; the rest of the response can't change the score
             
-            # Calculate utilization score (0-1)
-            if expected_patterns:
-                utilization_score = pattern_matches / len(expected_patterns)
-            else:
-                utilization_score = 0
+            # Utilization score (0-1): share of the intent's expected patterns present
+            scores = (hits.sum(axis=1) / len(patterns))[inverse]
+            utilization_scores[rows] = scores
             
-            utilization_scores.append(utilization_score)
-            intent_utilization[expected_intent].append(utilization_score)
-        
-        # Calculate per-intent utilization
-        per_intent_utilization = {}
-        for intent in ['technical', 'billing', 'feature']:
-            if intent_utilization[intent]:
-                per_intent_utilization[intent] = {
-                    'mean': np.mean(intent_utilization[intent]),
-                    'std': np.std(intent_utilization[intent]),
-                    'min': np.min(intent_utilization[intent]),
-                    'max': np.max(intent_utilization[intent])
-                }
+            per_intent_utilization[intent] = self._summary_stats(scores)
         
         return {
             'overall_mean_utilization': np.mean(utilization_scores),
             'overall_std_utilization': np.std(utilization_scores),
             'per_intent_utilization': per_intent_utilization,
-            'individual_scores': utilization_scores
+            'individual_scores': utilization_scores.tolist()
         }
     
     def calculate_response_quality_metrics(self, responses: List[str]) -> Dict[str, float]:
         """Calculate general response quality metrics"""
         
-        quality_metrics = {
-            'length': [],
-            'readability': [],
-            'structure': [],
-            'completeness': []
-        }
+        # Each distinct response is measured once and the results are scattered back
+        unique_responses, inverse = self._dedupe(responses)
+        n = len(unique_responses)
+        length = np.empty(n, dtype=np.int64)
+        structure = np.empty(n)
+        completeness = np.empty(n)
+        sentence_words = np.empty(n)
+        sentence_counts = np.empty(n)
         
-        for response in responses:
+        for i, response in enumerate(unique_responses):
             # Response length
-            words = response.split()
-            quality_metrics['length'].append(len(words))
+            length[i] = len(response.split())
             
-            # Readability (simplified Flesch Reading Ease)
-            sentences = response.split('.')
-            avg_sentence_length = np.mean([len(s.split()) for s in sentences if s.strip()])
-            quality_metrics['readability'].append(1.0 / (1.0 + avg_sentence_length / 20.0))  # Simplified
+            # Readability inputs: words across sentences and number of non-blank sentences
+            sentence_words[i] = len(response.replace('.', ' ').split())
+            sentence_counts[i] = len(_SENTENCE_RE.findall(response))
             
             # Structure (presence of formatting)
-            has_structure = any(marker in response for marker in ['**', '*', '-', '1.', '2.', '3.'])
-            quality_metrics['structure'].append(1.0 if has_structure else 0.0)
+            structure[i] = 1.0 if _STRUCTURE_RE.search(response) else 0.0
             
             # Completeness (has multiple sentences)
-            quality_metrics['completeness'].append(1.0 if len(sentences) > 2 else 0.5)
+            completeness[i] = 1.0 if response.count('.') >= 2 else 0.5
+        
+        # Readability (simplified Flesch Reading Ease); NaN for responses without any sentence
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_sentence_length = sentence_words / sentence_counts
+        readability = 1.0 / (1.0 + avg_sentence_length / 20.0)  # Simplified
+        
+        length, readability, structure, completeness = (
+            length[inverse], readability[inverse], structure[inverse], completeness[inverse]
+        )
         
         # Calculate averages
         return {
-            'avg_length': np.mean(quality_metrics['length']),
-            'avg_readability': np.mean(quality_metrics['readability']),
-            'avg_structure': np.mean(quality_metrics['structure']),
-            'avg_completeness': np.mean(quality_metrics['completeness']),
-            'individual_metrics': quality_metrics
+            'avg_length': length.mean(),
+            'avg_readability': readability.mean(),
+            'avg_structure': structure.mean(),
+            'avg_completeness': completeness.mean(),
+            'individual_metrics': {
+                'length': length.tolist(),
+                'readability': readability.tolist(),
+                'structure': structure.tolist(),
+                'completeness': completeness.tolist()
+            }
         }
     
-    def calculate_performance_metrics(self, response_times: List[float], token_usage: List[int]) -> Dict[str, float]:
-        """Calculate performance metrics"""
+    def calculate_performance_metrics(self, response_times: List[float], token_usage: List[int],
+                                      cache_hits: Optional[List[bool]] = None) -> Dict[str, float]:
+        """Calculate performance metrics.
+        
+        Timing and token statistics cover backend (cold) calls only, since cache
+        hits cost no backend time or tokens and would drag the averages towards
+        zero. With no cold calls at all they are NaN, as nothing was measured.
+        """
+        
+        response_times = np.asarray(response_times, dtype=np.float64)
+        token_usage = np.asarray(token_usage, dtype=np.int64)
+        cache_hits = np.zeros(response_times.size, dtype=bool) if cache_hits is None else np.asarray(cache_hits, dtype=bool)
+        
+        hits = int(cache_hits.sum())
+        response_times = response_times[~cache_hits]
+        token_usage = token_usage[~cache_hits]
+        
+        if response_times.size:
+            avg_time = float(response_times.mean())
+            p50, p95, p99 = np.percentile(response_times, [50, 95, 99])
+            cold_stats = {
+                'avg_response_time': avg_time,
+                'std_response_time': float(response_times.std()),
+                'min_response_time': float(response_times.min()),
+                'max_response_time': float(response_times.max()),
+                'p50_response_time': float(p50),
+                'p95_response_time': float(p95),
+                'p99_response_time': float(p99),
+                'avg_tokens': float(token_usage.mean()),
+                'queries_per_second': 1.0 / avg_time if avg_time > 0 else 0
+            }
+        else:
+            cold_stats = dict.fromkeys((
+                'avg_response_time', 'std_response_time', 'min_response_time', 'max_response_time',
+                'p50_response_time', 'p95_response_time', 'p99_response_time', 'avg_tokens',
+                'queries_per_second'
+            ), float('nan'))
         
         return {
-            'avg_response_time': np.mean(response_times),
-            'std_response_time': np.std(response_times),
-            'min_response_time': np.min(response_times),
-            'max_response_time': np.max(response_times),
-            'avg_tokens': np.mean(token_usage) if token_usage else 0,
-            'total_tokens': np.sum(token_usage) if token_usage else 0,
-            'queries_per_second': 1.0 / np.mean(response_times) if response_times else 0
+            **cold_stats,
+            'total_tokens': int(token_usage.sum()),
+            'cold_calls': int(response_times.size),
+            'cache_hit_rate': hits / cache_hits.size if cache_hits.size else 0.0
         }
     
+    def calculate_all(self, queries: List[str], responses: List[str], expected_intents: List[str],
+                      predicted_intents: List[str], response_times: List[float],
+                      token_usage: List[int], valid: Optional[List[bool]] = None,
+                      cache_hits: Optional[List[bool]] = None) -> Dict[str, Any]:
+        """Calculate every per-run metric from one set of evaluation arrays.
+        
+        Rows flagged False in ``valid`` (failed queries) are left out of the
+        response relevance, context utilization and response quality scoring;
+        their individual scores are reported as NaN.
+        """
+        
+        n = len(responses)
+        valid = np.ones(n, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+        
+        if valid.all():
+            response_relevance = self.calculate_response_relevance(queries, responses, expected_intents)
+            context_utilization = self.calculate_context_utilization(responses, expected_intents)
+            response_quality = self.calculate_response_quality_metrics(responses)
+        else:
+            idx = np.flatnonzero(valid)
+            valid_queries = [queries[i] for i in idx]
+            valid_responses = [responses[i] for i in idx]
+            valid_intents = [expected_intents[i] for i in idx]
+            
+            response_relevance = self.calculate_response_relevance(valid_queries, valid_responses, valid_intents)
+            response_relevance['individual_similarities'] = self._scatter(
+                response_relevance['individual_similarities'], idx, n
+            )
+            
+            context_utilization = self.calculate_context_utilization(valid_responses, valid_intents)
+            context_utilization['individual_scores'] = self._scatter(
+                context_utilization['individual_scores'], idx, n
+            )
+            
+            response_quality = self.calculate_response_quality_metrics(valid_responses)
+            response_quality['individual_metrics'] = {
+                name: self._scatter(values, idx, n)
+                for name, values in response_quality['individual_metrics'].items()
+            }
+        
+        response_relevance['valid_responses'] = int(valid.sum())
+        
+        return {
+            'intent_accuracy': self.calculate_intent_accuracy(expected_intents, predicted_intents),
+            'response_relevance': response_relevance,
+            'context_utilization': context_utilization,
+            'response_quality': response_quality,
+            'performance_metrics': self.calculate_performance_metrics(response_times, token_usage, cache_hits)
+        }
+    
+    @staticmethod
+    def _intent_groups(expected_intents: List[str]) -> Dict[str, np.ndarray]:
+        """Row indices of each intent present, from one integer encoding and a bincount"""
+        label_ids = {label: i for i, label in enumerate(INTENT_LABELS)}
+        other = len(INTENT_LABELS)
+        codes = np.fromiter((label_ids.get(x, other) for x in expected_intents), dtype=np.int64,
+                            count=len(expected_intents))
+        
+        # A stable sort lays each intent's rows out contiguously, in their original order
+        counts = np.bincount(codes, minlength=other + 1)
+        order = np.argsort(codes, kind='stable')
+        ends = np.cumsum(counts)
+        return {
+            label: order[ends[k] - counts[k]:ends[k]]
+            for k, label in enumerate(INTENT_LABELS) if counts[k]
+        }
+    
+    @staticmethod
+    def _summary_stats(values) -> Dict[str, float]:
+        """Mean, std, min and max of a non-empty score array, from one sum and one dot product"""
+        values = np.asarray(values, dtype=float)
+        n = values.size
+        mean = values.sum() / n
+        variance = max(values.dot(values) / n - mean * mean, 0.0)
+        return {
+            'mean': mean,
+            'std': np.sqrt(variance),
+            'min': values.min(),
+            'max': values.max()
+        }
+    
+    @staticmethod
+    def _scatter(values: List[float], idx: np.ndarray, n: int) -> List[float]:
+        """Place scores computed on a subset back at their original positions, NaN elsewhere"""
+        full = np.full(n, np.nan)
+        full[idx] = values
+        return full.tolist()
+    
     def calculate_ab_test_metrics(self, local_results: Dict[str, Any], openai_results: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate A/B test metrics between local and OpenAI models"""
         
+        # Pull each section out once
+        local_accuracy = local_results.get('intent_accuracy', {}).get('overall_accuracy', 0)
+        openai_accuracy = openai_results.get('intent_accuracy', {}).get('overall_accuracy', 0)
+        local_relevance = local_results.get('response_relevance', {}).get('overall_mean_relevance', 0)
+        openai_relevance = openai_results.get('response_relevance', {}).get('overall_mean_relevance', 0)
+        local_performance = local_results.get('performance_metrics', {})
+        openai_performance = openai_results.get('performance_metrics', {})
+        local_time = local_performance.get('avg_response_time', 0)
+        openai_time = openai_performance.get('avg_response_time', 1)
+        timed = not (np.isnan(local_time) or np.isnan(openai_time))
+        local_tokens = local_performance.get('total_tokens', 0)
+        
         # Compare key metrics
         comparison = {
             'accuracy_comparison': {
-                'local': local_results.get('intent_accuracy', {}).get('overall_accuracy', 0),
-                'openai': openai_results.get('intent_accuracy', {}).get('overall_accuracy', 0),
-                'difference': openai_results.get('intent_accuracy', {}).get('overall_accuracy', 0) - 
-                            local_results.get('intent_accuracy', {}).get('overall_accuracy', 0)
+                'local': local_accuracy,
+                'openai': openai_accuracy,
+                'difference': openai_accuracy - local_accuracy
             },
             'relevance_comparison': {
-                'local': local_results.get('response_relevance', {}).get('overall_mean_relevance', 0),
-                'openai': openai_results.get('response_relevance', {}).get('overall_mean_relevance', 0),
-                'difference': openai_results.get('response_relevance', {}).get('overall_mean_relevance', 0) - 
-                            local_results.get('response_relevance', {}).get('overall_mean_relevance', 0)
+                'local': local_relevance,
+                'openai': openai_relevance,
+                'difference': openai_relevance - local_relevance
             },
             'performance_comparison': {
-                'local_avg_time': local_results.get('performance_metrics', {}).get('avg_response_time', 0),
-                'openai_avg_time': openai_results.get('performance_metrics', {}).get('avg_response_time', 0),
-                'speed_improvement': local_results.get('performance_metrics', {}).get('avg_response_time', 0) / 
-                                  max(openai_results.get('performance_metrics', {}).get('avg_response_time', 1), 1)
+                'local_avg_time': local_time,
+                'openai_avg_time': openai_time,
+                # NaN when either side was served entirely from cache and has no timing
+                'speed_improvement': local_time / max(openai_time, 1) if timed else float('nan')
             },
             'cost_comparison': {
-                'local_tokens': local_results.get('performance_metrics', {}).get('total_tokens', 0),
-                'openai_tokens': openai_results.get('performance_metrics', {}).get('total_tokens', 0),
-                'token_efficiency': local_results.get('performance_metrics', {}).get('total_tokens', 0) / 
-                                  max(openai_results.get('performance_metrics', {}).get('total_tokens', 1), 1)
+                'local_tokens': local_tokens,
+                'openai_tokens': openai_performance.get('total_tokens', 0),
+                'token_efficiency': local_tokens / max(openai_performance.get('total_tokens', 1), 1)
             }
         }
         
@@ -287,10 +540,12 @@ class MetricsCalculator:
         else:
             local_score += 1
         
-        if comparison['performance_comparison']['speed_improvement'] > 1:
-            local_score += 1
-        else:
-            openai_score += 1
+        # Without timings on both sides, speed doesn't count towards the winner
+        if timed:
+            if comparison['performance_comparison']['speed_improvement'] > 1:
+                local_score += 1
+            else:
+                openai_score += 1
         
         comparison['winner'] = 'openai' if openai_score > local_score else 'local' if local_score > openai_score else 'tie'
         comparison['scores'] = {'local': local_score, 'openai': openai_score}
@@ -300,39 +555,41 @@ class MetricsCalculator:
     def generate_evaluation_report(self, all_metrics: Dict[str, Any]) -> str:
         """Generate a comprehensive evaluation report"""
         
-        report = "# Customer Support System Evaluation Report\n\n"
+        report = io.StringIO()
+        write = report.write
+        write("# Customer Support System Evaluation Report\n\n")
         
         # Intent Accuracy
         intent_acc = all_metrics.get('intent_accuracy', {})
-        report += f"## Intent Classification Accuracy\n"
-        report += f"- Overall Accuracy: {intent_acc.get('overall_accuracy', 0):.3f}\n"
-        report += f"- Macro Average F1: {intent_acc.get('macro_avg_f1', 0):.3f}\n\n"
+        write(f"## Intent Classification Accuracy\n")
+        write(f"- Overall Accuracy: {intent_acc.get('overall_accuracy', 0):.3f}\n")
+        write(f"- Macro Average F1: {intent_acc.get('macro_avg_f1', 0):.3f}\n\n")
         
         # Response Relevance
         relevance = all_metrics.get('response_relevance', {})
-        report += f"## Response Relevance\n"
-        report += f"- Overall Mean Relevance: {relevance.get('overall_mean_relevance', 0):.3f}\n"
-        report += f"- Overall Std Relevance: {relevance.get('overall_std_relevance', 0):.3f}\n\n"
+        write(f"## Response Relevance\n")
+        write(f"- Overall Mean Relevance: {relevance.get('overall_mean_relevance', 0):.3f}\n")
+        write(f"- Overall Std Relevance: {relevance.get('overall_std_relevance', 0):.3f}\n\n")
         
         # Context Utilization
         utilization = all_metrics.get('context_utilization', {})
-        report += f"## Context Utilization\n"
-        report += f"- Overall Mean Utilization: {utilization.get('overall_mean_utilization', 0):.3f}\n"
-        report += f"- Overall Std Utilization: {utilization.get('overall_std_utilization', 0):.3f}\n\n"
+        write(f"## Context Utilization\n")
+        write(f"- Overall Mean Utilization: {utilization.get('overall_mean_utilization', 0):.3f}\n")
+        write(f"- Overall Std Utilization: {utilization.get('overall_std_utilization', 0):.3f}\n\n")
         
         # Performance
         performance = all_metrics.get('performance_metrics', {})
-        report += f"## Performance Metrics\n"
-        report += f"- Average Response Time: {performance.get('avg_response_time', 0):.3f}s\n"
-        report += f"- Queries per Second: {performance.get('queries_per_second', 0):.3f}\n"
-        report += f"- Total Tokens Used: {performance.get('total_tokens', 0)}\n\n"
+        write(f"## Performance Metrics\n")
+        write(f"- Average Response Time: {performance.get('avg_response_time', 0):.3f}s\n")
+        write(f"- Queries per Second: {performance.get('queries_per_second', 0):.3f}\n")
+        write(f"- Total Tokens Used: {performance.get('total_tokens', 0)}\n\n")
         
         # A/B Test Results
         if 'ab_test_metrics' in all_metrics:
             ab_test = all_metrics['ab_test_metrics']
-            report += f"## A/B Test Results\n"
-            report += f"- Winner: {ab_test.get('winner', 'N/A')}\n"
-            report += f"- Local Score: {ab_test.get('scores', {}).get('local', 0)}\n"
-            report += f"- OpenAI Score: {ab_test.get('scores', {}).get('openai', 0)}\n\n"
+            write(f"## A/B Test Results\n")
+            write(f"- Winner: {ab_test.get('winner', 'N/A')}\n")
+            write(f"- Local Score: {ab_test.get('scores', {}).get('local', 0)}\n")
+            write(f"- OpenAI Score: {ab_test.get('scores', {}).get('openai', 0)}\n\n")
         
-        return report 
\ No newline at end of file
+        return report.getvalue() 
\ No newline at end of file
@@ -4,6 +4,7 @@ Generates test queries for evaluation (20 per intent category)
 """
 
 from typing import Dict, List, Tuple
+from itertools import chain
 import random
 
 class TestQueryGenerator:
@@ -81,17 +82,23 @@ class TestQueryGenerator:
         }
         
         # Expected intents for each query (for evaluation)
-        self.expected_intents = {}
-        for intent, queries in self.test_queries.items():
-            for query in queries:
-                self.expected_intents[query] = intent
+        self.expected_intents = {
+            query: intent for intent, queries in self.test_queries.items() for query in queries
+        }
+        
+        # Flat views shared by every evaluation sweep, rebuilt when queries are added
+        self._refresh_flat_views()
+    
+    def _refresh_flat_views(self):
+        """Materialize the flat query list and query-intent pairs"""
+        self._all_queries = tuple(chain.from_iterable(self.test_queries.values()))
+        self._pairs = tuple(
+            (query, intent) for intent, queries in self.test_queries.items() for query in queries
+        )
     
     def get_all_test_queries(self) -> List[str]:
         """Get all test queries as a flat list"""
-        all_queries = []
-        for queries in self.test_queries.values():
-            all_queries.extend(queries)
-        return all_queries
+        return list(self._all_queries)
     
     def get_queries_by_intent(self, intent: str) -> List[str]:
         """Get test queries for a specific intent"""
@@ -101,18 +108,18 @@ class TestQueryGenerator:
         """Get expected intent for a query"""
         return self.expected_intents.get(query, "technical")
     
+    def get_expected_intents(self, queries: List[str]) -> List[str]:
+        """Get expected intents for a list of queries"""
+        lookup = self.expected_intents.get
+        return [lookup(query, "technical") for query in queries]
+    
     def get_query_intent_pairs(self) -> List[Tuple[str, str]]:
         """Get all query-intent pairs for evaluation"""
-        pairs = []
-        for intent, queries in self.test_queries.items():
-            for query in queries:
-                pairs.append((query, intent))
-        return pairs
+        return list(self._pairs)
     
     def get_random_sample(self, size: int = 10) -> List[str]:
         """Get a random sample of test queries"""
-        all_queries = self.get_all_test_queries()
-        return random.sample(all_queries, min(size, len(all_queries)))
+        return random.sample(self._all_queries, min(size, len(self._all_queries)))
     
     def get_balanced_sample(self, samples_per_intent: int = 5) -> List[str]:
         """Get a balanced sample with equal queries per intent"""
@@ -138,6 +145,7 @@ class TestQueryGenerator:
         
         self.test_queries[expected_intent].append(query)
         self.expected_intents[query] = expected_intent
+        self._refresh_flat_views()
     
     def get_query_categories(self) -> Dict[str, List[str]]:
         """Get queries organized by subcategories"""
@@ -4,15 +4,67 @@ Classifies queries into Technical Support, Billing/Account, or Feature Requests
 """
 
 import re
-import json
+import asyncio
 import logging
 import os
+from collections import Counter, OrderedDict
 from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from threading import Lock
+import numpy as np
+import orjson
 from llm_wrapper import LLMWrapper
 
 logger = logging.getLogger(__name__)
 
+LLM_FAILURE_REASONING = "LLM classification failed"
+
+# Static classification instructions, sent as the system message so the backends can
+# reuse the processed prefix and only the short query changes between calls
+CLASSIFICATION_SYSTEM_PROMPT = """You are a customer support classifier. Determine if the query is about technical support, billing/account, or feature request.
+
+Technical Support includes: API issues, integration problems, error messages, setup/configuration, code examples, troubleshooting, authentication issues, performance problems, bugs, crashes, documentation questions.
+
+Billing/Account includes: Payment issues, subscription management, pricing questions, account settings, billing information, refunds, plan changes, trial questions.
+
+Feature Request includes: Requests for new functionality, suggestions for improvements, asking if features exist, enhancement requests, new tool requests.
+
+Respond with exactly one word: "technical", "billing", or "feature". Then provide a brief reason (max 20 words)."""
+
+# Knowledge base files consulted by the keyword patterns, per intent
+KNOWLEDGE_BASE_FILES = {
+    "technical": "technical_kb.json",
+    "billing": "billing_kb.json",
+    "feature": "feature_roadmap.json"
+}
+
+@lru_cache(maxsize=4)
+def _parse_knowledge_bases(data_dir: str, mtimes: Tuple[Optional[float], ...]) -> Dict[str, Dict]:
+    """Parse the knowledge base files found in data_dir, cached until one of them changes"""
+    knowledge_bases = {}
+    for (intent, filename), mtime in zip(KNOWLEDGE_BASE_FILES.items(), mtimes):
+        if mtime is not None:
+            with open(os.path.join(data_dir, filename), 'rb') as f:
+                knowledge_bases[intent] = orjson.loads(f.read())
+    
+    logger.info(f"Loaded {len(knowledge_bases)} knowledge bases")
+    return knowledge_bases
+
+def _load_knowledge_bases_cached(data_dir: str) -> Dict[str, Dict]:
+    """Load the knowledge base files found in data_dir"""
+    try:
+        # Missing files are part of the key too, so adding one later is picked up
+        mtimes = tuple(
+            os.stat(path).st_mtime if os.path.exists(path) else None
+            for path in (os.path.join(data_dir, filename) for filename in KNOWLEDGE_BASE_FILES.values())
+        )
+        # A failed parse raises out of the cached function, so it is retried next time
+        return _parse_knowledge_bases(data_dir, mtimes)
+    except Exception as e:
+        logger.warning(f"Failed to load knowledge bases: {e}")
+        return {}
+
 @dataclass
 class IntentResult:
     """Result of intent classification"""
@@ -24,9 +76,21 @@ class IntentResult:
 class IntentDetector:
     """Intent classification system using LLM and keyword matching"""
     
-    def __init__(self, llm_wrapper: LLMWrapper):
+    def __init__(self, llm_wrapper: LLMWrapper, cache_size: int = 4096,
+                 semantic_threshold: Optional[float] = None):
         self.llm = llm_wrapper
         
+        # Exact-match LRU of classifications, keyed by the normalized query
+        self.cache_size = cache_size
+        self._result_cache: "OrderedDict[str, IntentResult]" = OrderedDict()
+        self._cache_lock = Lock()
+        
+        # Optional second tier reusing the classification of a near-duplicate query
+        self.semantic_threshold = semantic_threshold
+        self._embedder = self._load_embedder() if semantic_threshold is not None else None
+        self._cached_embeds: Optional[np.ndarray] = None
+        self._cached_results: List[IntentResult] = []
+        
         # Intent categories
         self.intents = {
             "technical": "Technical Support",
@@ -37,8 +101,33 @@ class IntentDetector:
         # Load knowledge bases for enhanced classification
         self.knowledge_bases = self._load_knowledge_bases()
         
-        # Enhanced keyword patterns using knowledge base content
-        self.keyword_patterns = self._build_enhanced_keyword_patterns()
+        # Enhanced keyword patterns using knowledge base content, compiled once
+        patterns = self._build_enhanced_keyword_patterns()
+        self.keyword_patterns = {
+            intent: [re.compile(pattern, re.IGNORECASE) for pattern in intent_patterns]
+            for intent, intent_patterns in patterns.items()
+        }
+        
+        self._intent_order = tuple(self.keyword_patterns)
+        
+        # Keyword results depend only on the query text, so repeated queries reuse them
+        self._keyword_cache = lru_cache(maxsize=4096)(self._match_keywords)
+        
+        # One alternation per intent, used to skip intents with no keyword hit in a single scan
+        self.fused_patterns = {
+            intent: re.compile("|".join(f"(?:{pattern})" for pattern in intent_patterns), re.IGNORECASE)
+            for intent, intent_patterns in patterns.items()
+        }
+        
+        # Queries are lowered before matching and the patterns are lowercase, so for ASCII
+        # text case-sensitive twins give the same matches without IGNORECASE's 5-7x slower scan
+        self._ascii_keyword_patterns = {
+            intent: [re.compile(pattern) for pattern in intent_patterns]
+            for intent, intent_patterns in patterns.items()
+        }
+        self._ascii_fused_patterns = {
+            intent: re.compile(fused.pattern) for intent, fused in self.fused_patterns.items()
+        }
         
         # Specialized prompt templates for each intent
         self.classification_prompts = {
@@ -82,40 +171,15 @@ Respond with exactly one word: "technical", "billing", or "feature". Then provid
         # Confidence thresholds
         self.confidence_thresholds = {
             "keyword": 0.3,
-            "llm": 0.7
+            "llm": 0.7,
+            "keyword_decisive": 0.6,  # Classification skips the LLM at or above this...
+            "keyword_margin": 2.0  # ...when the best intent also scores this many times the runner-up
         }
     
     def _load_knowledge_bases(self) -> Dict[str, Dict]:
         """Load knowledge base files for enhanced classification"""
-        knowledge_bases = {}
-        data_dir = "data"
-        
-        try:
-            # Load technical knowledge base
-            tech_path = os.path.join(data_dir, "technical_kb.json")
-            if os.path.exists(tech_path):
-                with open(tech_path, 'r') as f:
-                    knowledge_bases["technical"] = json.load(f)
-            
-            # Load billing knowledge base
-            billing_path = os.path.join(data_dir, "billing_kb.json")
-            if os.path.exists(billing_path):
-                with open(billing_path, 'r') as f:
-                    knowledge_bases["billing"] = json.load(f)
-            
-            # Load feature roadmap
-            feature_path = os.path.join(data_dir, "feature_roadmap.json")
-            if os.path.exists(feature_path):
-                with open(feature_path, 'r') as f:
-                    knowledge_bases["feature"] = json.load(f)
-                    
-            logger.info(f"Loaded {len(knowledge_bases)} knowledge bases")
-            
-        except Exception as e:
-            logger.warning(f"Failed to load knowledge bases: {e}")
-            knowledge_bases = {}
-        
-        return knowledge_bases
+        # Parsed once per version of the files and shared by every detector
+        return dict(_load_knowledge_bases_cached("data"))
     
     def _build_enhanced_keyword_patterns(self) -> Dict[str, List[str]]:
         """Build enhanced keyword patterns using knowledge base content"""
@@ -172,113 +236,228 @@ Respond with exactly one word: "technical", "billing", or "feature". Then provid
         
         return patterns
     
-    def classify_intent(self, query: str) -> IntentResult:
+    def classify_intent(self, query: str, force_llm: bool = False) -> IntentResult:
         """Classify the intent of a customer query"""
         query_lower = query.lower().strip()
         
+        cached, embedding = self._lookup_cache(query_lower)
+        if cached:
+            return cached
+        
         # Step 1: Keyword-based classification
         keyword_result = self._classify_by_keywords(query_lower)
+        if not force_llm and self._is_keyword_decisive(query_lower):
+            logger.info(f"Intent classification for '{query}': {keyword_result.intent} (keywords decisive)")
+            return keyword_result
         
         # Step 2: LLM-based classification
         llm_result = self._classify_by_llm(query)
         
         # Step 3: Combine results
         final_result = self._combine_classifications(keyword_result, llm_result, query_lower)
+        self._store_cache(query_lower, embedding, final_result, llm_result)
         
         logger.info(f"Intent classification for '{query}': {final_result.intent} (confidence: {final_result.confidence:.2f})")
         
         return final_result
     
+    async def aclassify_intent(self, query: str, force_llm: bool = False) -> IntentResult:
+        """Classify the intent of a customer query, awaiting the LLM asynchronously"""
+        query_lower = query.lower().strip()
+        
+        cached, embedding = self._lookup_cache(query_lower)
+        if cached:
+            return cached
+        
+        keyword_result = self._classify_by_keywords(query_lower)
+        if not force_llm and self._is_keyword_decisive(query_lower):
+            logger.info(f"Intent classification for '{query}': {keyword_result.intent} (keywords decisive)")
+            return keyword_result
+        
+        llm_result = await self._aclassify_by_llm(query)
+        final_result = self._combine_classifications(keyword_result, llm_result, query_lower)
+        self._store_cache(query_lower, embedding, final_result, llm_result)
+        
+        logger.info(f"Intent classification for '{query}': {final_result.intent} (confidence: {final_result.confidence:.2f})")
+        
+        return final_result
+    
+    @staticmethod
+    def _load_embedder():
+        """Load the sentence embedding model used by the semantic classification cache"""
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(os.getenv("SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2"))
+    
+    def _lookup_cache(self, query: str) -> Tuple[Optional[IntentResult], Optional[np.ndarray]]:
+        """Return a cached classification for the normalized query (or a near-duplicate) and its embedding"""
+        with self._cache_lock:
+            cached = self._result_cache.get(query)
+            if cached:
+                self._result_cache.move_to_end(query)
+                return replace(cached, keywords=list(cached.keywords)), None
+        
+        if self._embedder is None:
+            return None, None
+        
+        embedding = self._embedder.encode([query], normalize_embeddings=True)[0].astype(np.float32)
+        with self._cache_lock:
+            if self._cached_embeds is not None:
+                # Embeddings are unit-normalized, so the dot product is the cosine similarity
+                sims = self._cached_embeds @ embedding
+                best = int(sims.argmax())
+                if sims[best] >= self.semantic_threshold:
+                    cached = self._cached_results[best]
+                    return replace(cached, keywords=list(cached.keywords)), embedding
+        return None, embedding
+    
+    def _store_cache(self, query: str, embedding: Optional[np.ndarray], result: IntentResult,
+                     llm_result: IntentResult):
+        """Cache a classification, unless the LLM step failed and the result is only a fallback"""
+        if llm_result.reasoning == LLM_FAILURE_REASONING:
+            return
+        
+        result = replace(result, keywords=list(result.keywords))
+        with self._cache_lock:
+            self._result_cache[query] = result
+            self._result_cache.move_to_end(query)
+            if len(self._result_cache) > self.cache_size:
+                self._result_cache.popitem(last=False)
+            
+            if embedding is not None:
+                self._cached_embeds = (
+                    embedding[None] if self._cached_embeds is None
+                    else np.vstack([self._cached_embeds, embedding])
+                )
+                self._cached_results.append(result)
+                if len(self._cached_results) > self.cache_size:
+                    self._cached_embeds = self._cached_embeds[1:]
+                    self._cached_results.pop(0)
+    
     def _classify_by_keywords(self, query: str) -> IntentResult:
         """Classify intent using keyword patterns"""
-        scores = {}
-        matched_keywords = {}
+        result, _ = self._keyword_cache(query)
+        return replace(result, keywords=list(result.keywords))
+    
+    def _is_keyword_decisive(self, query: str) -> bool:
+        """Whether keywords alone settle the intent, so the LLM would only confirm it"""
+        result, runner_up = self._keyword_cache(query)
+        return (
+            result.confidence >= self.confidence_thresholds["keyword_decisive"]
+            and len(result.keywords) >= self.confidence_thresholds["keyword_margin"] * runner_up
+        )
+    
+    def _match_keywords(self, query: str) -> Tuple[IntentResult, int]:
+        """Score a query against every intent's keyword patterns, returning the result and runner-up score"""
+        # Per-intent scores in a flat list, in keyword_patterns order
+        scores = []
+        matched_keywords = []
+        
+        if query.isascii():
+            keyword_patterns, fused_patterns = self._ascii_keyword_patterns, self._ascii_fused_patterns
+        else:
+            keyword_patterns, fused_patterns = self.keyword_patterns, self.fused_patterns
         
-        for intent, patterns in self.keyword_patterns.items():
+        for intent, patterns in keyword_patterns.items():
             score = 0
             keywords = []
             
-            for pattern in patterns:
-                matches = re.findall(pattern, query, re.IGNORECASE)
-                if matches:
-                    score += len(matches)
-                    keywords.extend(matches)
+            # One fused scan rules out intents with no hit. Patterns overlap (e.g. "plan"
+            # appears twice for billing) and each counts its own matches, so scoring
+            # still goes pattern by pattern
+            if fused_patterns[intent].search(query):
+                for pattern in patterns:
+                    matches = pattern.findall(query)
+                    if matches:
+                        score += len(matches)
+                        keywords.extend(matches)
             
-            scores[intent] = score
-            matched_keywords[intent] = keywords
+            scores.append(score)
+            matched_keywords.append(keywords)
         
-        # Find the intent with highest score
+        # Find the intent with highest score (first one on ties)
         if scores:
-            best_intent = max(scores, key=scores.get)
-            max_score = scores[best_intent]
-            total_keywords = sum(len(kw) for kw in matched_keywords.values())
+            best = scores.index(max(scores))
+            max_score = scores[best]
+            runner_up = max(scores[:best] + scores[best + 1:], default=0)
             
-            confidence = min(max_score / max(total_keywords, 1), 1.0)
+            # Every matched keyword was counted once in some score
+            confidence = min(max_score / max(sum(scores), 1), 1.0)
             
             return IntentResult(
-                intent=best_intent,
+                intent=self._intent_order[best],
                 confidence=confidence,
-                keywords=matched_keywords[best_intent],
-                reasoning=f"Keyword match: {', '.join(matched_keywords[best_intent])}"
-            )
+                keywords=matched_keywords[best],
+                reasoning=f"Keyword match: {', '.join(matched_keywords[best])}"
+            ), runner_up
         
         return IntentResult(
             intent="technical",  # Default fallback
             confidence=0.1,
             keywords=[],
             reasoning="No keyword matches found"
-        )
+        ), 0
     
     def _classify_by_llm(self, query: str) -> IntentResult:
         """Classify intent using LLM"""
         try:
-            # Use a generic prompt for classification
-            prompt = f"""You are a customer support classifier. Determine if this query is about technical support, billing/account, or feature request.
-
-Query: "{query}"
-
-Technical Support includes: API issues, integration problems, error messages, setup/configuration, code examples, troubleshooting, authentication issues, performance problems, bugs, crashes, documentation questions.
-
-Billing/Account includes: Payment issues, subscription management, pricing questions, account settings, billing information, refunds, plan changes, trial questions.
-
-Feature Request includes: Requests for new functionality, suggestions for improvements, asking if features exist, enhancement requests, new tool requests.
-
-Respond with exactly one word: "technical", "billing", or "feature". Then provide a brief reason (max 20 words)."""
-
-            response = self.llm.generate(prompt)
-            
-            if response and response.success:
-                content = response.content.strip().lower()
-                
-                # Extract intent from response
-                intent = None
-                if "technical" in content:
-                    intent = "technical"
-                elif "billing" in content:
-                    intent = "billing"
-                elif "feature" in content:
-                    intent = "feature"
-                
-                if intent:
-                    # Extract reasoning (everything after the intent word)
-                    reasoning_start = content.find(intent) + len(intent)
-                    reasoning = content[reasoning_start:].strip()
-                    
-                    return IntentResult(
-                        intent=intent,
-                        confidence=0.8,  # High confidence for LLM
-                        keywords=[],
-                        reasoning=f"LLM classification: {reasoning}"
-                    )
-            
+            response = self.llm.generate(
+                self._build_classification_prompt(query), system_prompt=CLASSIFICATION_SYSTEM_PROMPT
+            )
+            return self._parse_llm_classification(response)
+        except Exception as e:
+            logger.warning(f"LLM classification failed: {e}")
+            return self._llm_failure_result()
+    
+    async def _aclassify_by_llm(self, query: str) -> IntentResult:
+        """Classify intent using LLM without blocking the event loop"""
+        try:
+            response = await self.llm.agenerate(
+                self._build_classification_prompt(query), system_prompt=CLASSIFICATION_SYSTEM_PROMPT
+            )
+            return self._parse_llm_classification(response)
         except Exception as e:
             logger.warning(f"LLM classification failed: {e}")
+            return self._llm_failure_result()
+    
+    def _build_classification_prompt(self, query: str) -> str:
+        """Build the per-query part of the LLM classification prompt"""
+        return f'Query: "{query}"'
+    
+    def _parse_llm_classification(self, response) -> IntentResult:
+        """Extract the intent and reasoning from an LLM classification response"""
+        if response and response.success:
+            content = response.content.strip().lower()
+            
+            # Extract intent from response
+            intent = None
+            if "technical" in content:
+                intent = "technical"
+            elif "billing" in content:
+                intent = "billing"
+            elif "feature" in content:
+                intent = "feature"
+            
+            if intent:
+                # Extract reasoning (everything after the intent word)
+                reasoning_start = content.find(intent) + len(intent)
+                reasoning = content[reasoning_start:].strip()
+                
+                return IntentResult(
+                    intent=intent,
+                    confidence=0.8,  # High confidence for LLM
+                    keywords=[],
+                    reasoning=f"LLM classification: {reasoning}"
+                )
         
+        return self._llm_failure_result()
+    
+    def _llm_failure_result(self) -> IntentResult:
+        """Fallback result when the LLM gives no usable classification"""
         return IntentResult(
             intent="technical",
             confidence=0.1,
             keywords=[],
-            reasoning="LLM classification failed"
+            reasoning=LLM_FAILURE_REASONING
         )
     
     def _combine_classifications(self, keyword_result: IntentResult, llm_result: IntentResult, query: str) -> IntentResult:
@@ -355,12 +534,48 @@ Respond with exactly one word: "technical", "billing", or "feature". Then provid
         """Get list of all supported intents"""
         return list(self.intents.keys())
     
+    async def classify_intents_batch(self, queries: List[str], max_concurrency: int = 20) -> List[IntentResult]:
+        """Classify many queries, sending only those the keywords can't settle to the LLM, concurrently"""
+        results: List[Optional[IntentResult]] = [None] * len(queries)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        llm_tasks = []
+        
+        async def classify_with_llm(i, query, query_lower, embedding, keyword_result):
+            async with semaphore:
+                llm_result = await self._aclassify_by_llm(query)
+            results[i] = self._combine_classifications(keyword_result, llm_result, query_lower)
+            self._store_cache(query_lower, embedding, results[i], llm_result)
+        
+        uncached = []
+        for i, query in enumerate(queries):
+            query_lower = query.lower().strip()
+            cached, embedding = self._lookup_cache(query_lower)
+            if cached:
+                results[i] = cached
+            else:
+                uncached.append((i, query, query_lower, embedding))
+        
+        for i, query, query_lower, embedding in uncached:
+            # Both read the same memoized keyword scan, so each query is scored once
+            keyword_result = self._classify_by_keywords(query_lower)
+            if self._is_keyword_decisive(query_lower):
+                results[i] = keyword_result
+            else:
+                # Start the LLM call now so it overlaps the cache and keyword work for later queries
+                llm_tasks.append(asyncio.create_task(
+                    classify_with_llm(i, query, query_lower, embedding, keyword_result)
+                ))
+                await asyncio.sleep(0)
+        
+        await asyncio.gather(*llm_tasks)
+        
+        logger.info(f"Batch classified {len(queries)} queries ({len(llm_tasks)} needed the LLM)")
+        return results
+    
     def get_intent_statistics(self, queries: List[str]) -> Dict[str, int]:
         """Get statistics of intent distribution for a list of queries"""
-        stats = {intent: 0 for intent in self.intents}
-        
-        for query in queries:
-            result = self.classify_intent(query)
-            stats[result.intent] += 1
+        results = asyncio.run(self.classify_intents_batch(queries))
+        counts = Counter(dict.fromkeys(self.intents, 0))
+        counts.update(result.intent for result in results)
         
-        return stats 
\ No newline at end of file
+        return dict(counts) 
\ No newline at end of file
@@ -4,15 +4,18 @@ Handles Ollama (local) and OpenAI (fallback) with request queuing and streaming
 """
 
 import asyncio
-import json
 import time
 import logging
 from typing import Dict, List, Optional, AsyncGenerator, Any
 from dataclasses import dataclass
+from collections import deque
+from itertools import islice
 from queue import Queue, Empty
 from threading import Thread, Lock
 import requests
+from requests.adapters import HTTPAdapter
 import openai
+import orjson
 from openai import AsyncOpenAI
 import os
 from dotenv import load_dotenv
@@ -32,6 +35,46 @@ class LLMResponse:
     response_time: float
     success: bool
     error_message: Optional[str] = None
+    # Set on failures caused by timeouts, dropped connections, rate limits or server
+    # errors, which a later attempt may not hit
+    transient: bool = False
+
+# Errors worth retrying; anything else (bad request, unknown model, auth) fails the same way again
+_TRANSIENT_ERRORS = (
+    requests.Timeout, requests.ConnectionError,
+    openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError
+)
+
+def _is_transient(error: BaseException) -> bool:
+    """Whether an error, or any error it was raised from, is a transient network or server failure"""
+    while error is not None:
+        if isinstance(error, _TRANSIENT_ERRORS):
+            return True
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        error = error.__cause__
+    return False
+
+def parse_batch_answers(content: str, count: int) -> List[Optional[str]]:
+    """Extract the numbered answers from a batch reply, None where an answer is missing"""
+    answers: List[Optional[str]] = [None] * count
+    
+    # Models often wrap the array in prose or a code fence
+    start, end = content.find("["), content.rfind("]")
+    if start == -1 or end < start:
+        return answers
+    try:
+        items = orjson.loads(content[start:end + 1])
+    except orjson.JSONDecodeError:
+        return answers
+    
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("answer"), str):
+            query_id = item.get("id")
+            if isinstance(query_id, int) and 1 <= query_id <= count:
+                answers[query_id - 1] = item["answer"]
+    return answers
 
 class RequestQueue:
     """Thread-safe request queue for concurrent processing"""
@@ -41,20 +84,25 @@ class RequestQueue:
         self.processing_lock = Lock()
         self.active_requests = 0
         
-    def add_request(self, request_id: str, prompt: str, callback) -> bool:
+    def add_request(self, request_id: str, prompt: str, callback, system_prompt: Optional[str] = None,
+                    json_mode: bool = False) -> bool:
         """Add request to queue"""
         try:
-            self.queue.put_nowait((request_id, prompt, callback))
+            self.queue.put_nowait((request_id, prompt, callback, system_prompt, json_mode))
             return True
         except:
             return False
     
-    def get_request(self) -> Optional[tuple]:
-        """Get next request from queue"""
+    def get_request(self, timeout: float = 1.0) -> Optional[tuple]:
+        """Wait up to timeout seconds for the next request and mark it active"""
         try:
-            return self.queue.get_nowait()
+            request = self.queue.get(timeout=timeout)
         except Empty:
             return None
+        
+        with self.processing_lock:
+            self.active_requests += 1
+        return request
     
     def mark_complete(self):
         """Mark request as complete"""
@@ -65,11 +113,16 @@ class RequestQueue:
 class LLMWrapper:
     """Wrapper for LLM APIs with local/fallback switching and queuing"""
     
-    def __init__(self):
+    def __init__(self, local_model: Optional[str] = None):
         self.ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        self.local_model = os.getenv("LOCAL_MODEL_NAME", "tinyllama:1.1b")
+        self.local_model = local_model or os.getenv("LOCAL_MODEL_NAME", "tinyllama:1.1b")
         self.openai_model = os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo")
         
+        # How long Ollama keeps the model loaded after each call. Ollama takes a duration
+        # string ("60m") or a number of seconds, where -1 keeps the model loaded indefinitely
+        keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "60m")
+        self.keep_alive = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+        
         # Initialize OpenAI client
         openai_api_key = os.getenv("OPENAI_API_KEY")
         if openai_api_key:
@@ -80,24 +133,57 @@ class LLMWrapper:
             self.openai_available = False
             logger.warning("OpenAI API key not found. Fallback will not be available.")
         
+        # Shared HTTP session so Ollama calls reuse keep-alive connections
+        self._http = requests.Session()
+        self._http.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+        self._http.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+        
+        # Long-lived event loop that runs every OpenAI call. The client's pooled connections
+        # are bound to the loop that opened them, so sync callers and other event loops
+        # (e.g. one asyncio.run per evaluation sweep) all go through this one
+        self._loop = asyncio.new_event_loop()
+        Thread(target=self._loop.run_forever, daemon=True).start()
+        
         # Request queue for concurrent processing
         self.request_queue = RequestQueue()
-        self.processing_thread = Thread(target=self._process_queue, daemon=True)
-        self.processing_thread.start()
+        
+        # Several workers, so queued requests overlap their network waits
+        self._workers = [
+            Thread(target=self._process_queue, daemon=True)
+            for _ in range(int(os.getenv("LLM_WORKERS", "8")))
+        ]
+        for worker in self._workers:
+            worker.start()
         
         # Performance tracking
         self.local_success_rate = 0.0
-        self.local_response_times = []
+        self.local_response_times = deque(maxlen=100)
         self.fallback_usage_count = 0
+        # Queue workers, evaluator threads and event loops all record timings concurrently
+        self._metrics_lock = Lock()
         
+        # Load the local model in the background so the first real call doesn't pay for it
+        Thread(target=self._warm_up_local_model, daemon=True).start()
+        
+    def _warm_up_local_model(self):
+        """Ask Ollama to load the local model without generating anything"""
+        try:
+            self._http.post(
+                f"{self.ollama_url}/api/generate",
+                json={"model": self.local_model, "keep_alive": self.keep_alive, "stream": False},
+                timeout=120
+            )
+        except Exception as e:
+            logger.debug(f"Local model warmup skipped: {e}")
+    
     def _process_queue(self):
         """Background thread to process queued requests"""
         while True:
             request_data = self.request_queue.get_request()
             if request_data:
-                request_id, prompt, callback = request_data
+                request_id, prompt, callback, system_prompt, json_mode = request_data
                 try:
-                    response = self._process_single_request(prompt)
+                    response = self._process_single_request(prompt, system_prompt, json_mode)
                     callback(request_id, response)
                 except Exception as e:
                     logger.error(f"Error processing request {request_id}: {e}")
@@ -112,30 +198,32 @@ class LLMWrapper:
                     callback(request_id, error_response)
                 finally:
                     self.request_queue.mark_complete()
-            else:
-                time.sleep(0.1)  # Small delay to prevent busy waiting
     
-    def _process_single_request(self, prompt: str) -> LLMResponse:
+    def _process_single_request(self, prompt: str, system_prompt: Optional[str] = None,
+                                json_mode: bool = False) -> LLMResponse:
         """Process a single request with local/fallback logic"""
         start_time = time.time()
         
         # Try local model first
+        transient = False
         try:
-            response = self._call_ollama(prompt)
+            response = self._call_ollama(prompt, system_prompt, json_mode)
             if response.success:
                 self._update_local_metrics(response.response_time)
                 return response
         except Exception as e:
             logger.warning(f"Local model failed: {e}")
+            transient = _is_transient(e)
         
         # Fallback to OpenAI if available
         if self.openai_available:
             try:
-                response = self._call_openai(prompt)
+                response = self._call_openai(prompt, system_prompt, json_mode)
                 self.fallback_usage_count += 1
                 return response
             except Exception as e:
                 logger.error(f"OpenAI fallback failed: {e}")
+                transient = transient or _is_transient(e)
         
         # If both fail, return error response
         return LLMResponse(
@@ -144,33 +232,46 @@ class LLMWrapper:
             tokens_used=0,
             response_time=time.time() - start_time,
             success=False,
-            error_message="Both local and OpenAI models failed"
+            error_message="Both local and OpenAI models failed",
+            transient=transient
         )
     
-    def _call_ollama(self, prompt: str) -> LLMResponse:
+    def _call_ollama(self, prompt: str, system_prompt: Optional[str] = None, json_mode: bool = False) -> LLMResponse:
         """Call Ollama API"""
         start_time = time.time()
         
+        # The chat endpoint keeps the system message separate, so a repeated system
+        # prompt is served from the KV cache of the model kept loaded by keep_alive
+        messages = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+        
+        payload = {
+            "model": self.local_model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "max_tokens": 1000
+            }
+        }
+        if json_mode:
+            payload["format"] = "json"
+        
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.local_model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "max_tokens": 1000
-                    }
-                },
+            response = self._http.post(
+                f"{self.ollama_url}/api/chat",
+                json=payload,
                 timeout=30
             )
             
             if response.status_code == 200:
                 data = response.json()
-                content = data.get("response", "")
-                tokens_used = len(content.split())  # Approximate token count
+                content = data.get("message", {}).get("content", "")
+                # Ollama reports exact prompt and completion token counts
+                tokens_used = data.get("prompt_eval_count", 0) + data.get("eval_count", 0)
                 
                 return LLMResponse(
                     content=content,
@@ -180,21 +281,28 @@ class LLMWrapper:
                     success=True
                 )
             else:
-                raise Exception(f"Ollama API error: {response.status_code}")
+                raise requests.HTTPError(f"Ollama API error: {response.status_code}", response=response)
                 
         except Exception as e:
-            raise Exception(f"Ollama request failed: {e}")
+            raise Exception(f"Ollama request failed: {e}") from e
     
-    async def _call_openai_async(self, prompt: str) -> LLMResponse:
+    async def _call_openai_async(self, prompt: str, system_prompt: Optional[str] = None,
+                                 json_mode: bool = False) -> LLMResponse:
         """Call OpenAI API asynchronously"""
         start_time = time.time()
         
+        # Static instructions go first so the provider can reuse the cached prefix
+        messages = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+        
         try:
             response = await self.openai_client.chat.completions.create(
                 model=self.openai_model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=messages,
                 max_tokens=1000,
-                temperature=0.7
+                temperature=0.7,
+                **({"response_format": {"type": "json_object"}} if json_mode else {})
             )
             
             content = response.choices[0].message.content
@@ -209,25 +317,29 @@ class LLMWrapper:
             )
             
         except Exception as e:
-            raise Exception(f"OpenAI request failed: {e}")
+            raise Exception(f"OpenAI request failed: {e}") from e
     
-    def _call_openai(self, prompt: str) -> LLMResponse:
+    def _call_openai(self, prompt: str, system_prompt: Optional[str] = None, json_mode: bool = False) -> LLMResponse:
         """Synchronous wrapper for OpenAI call"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self._call_openai_async(prompt))
-        finally:
-            loop.close()
+        future = asyncio.run_coroutine_threadsafe(
+            self._call_openai_async(prompt, system_prompt, json_mode), self._loop
+        )
+        return future.result()
+    
+    async def _acall_openai(self, prompt: str, system_prompt: Optional[str] = None,
+                            json_mode: bool = False) -> LLMResponse:
+        """Await an OpenAI call from any event loop, running it on the client's own loop"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            self._call_openai_async(prompt, system_prompt, json_mode), self._loop
+        ))
     
     def _update_local_metrics(self, response_time: float):
         """Update local model performance metrics"""
-        self.local_response_times.append(response_time)
-        if len(self.local_response_times) > 100:
-            self.local_response_times.pop(0)
+        with self._metrics_lock:
+            self.local_response_times.append(response_time)  # deque drops the oldest past 100
+            recent_times = list(islice(reversed(self.local_response_times), 10))
         
         # Calculate success rate (simplified)
-        recent_times = self.local_response_times[-10:]
         self.local_success_rate = sum(1 for t in recent_times if t < 10.0) / len(recent_times)
     
     async def generate_stream(self, prompt: str) -> AsyncGenerator[str, None]:
@@ -256,66 +368,123 @@ class LLMWrapper:
     
     async def _stream_ollama(self, prompt: str) -> AsyncGenerator[str, None]:
         """Stream response from Ollama"""
+        # aiohttp is only needed for streaming, and its sessions are bound to the running
+        # loop (the app creates one per streaming request), so one session per stream
+        import aiohttp
+        
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.local_model,
-                    "prompt": prompt,
-                    "stream": True,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "max_tokens": 1000
+            timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=30)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(
+                    f"{self.ollama_url}/api/generate",
+                    json={
+                        "model": self.local_model,
+                        "prompt": prompt,
+                        "stream": True,
+                        "options": {
+                            "temperature": 0.7,
+                            "top_p": 0.9,
+                            "max_tokens": 1000
+                        }
                     }
-                },
-                stream=True,
-                timeout=30
-            )
-            
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line.decode('utf-8'))
-                    if 'response' in data:
-                        yield data['response']
-                    if data.get('done', False):
-                        break
+                ) as response:
+                    # Reads yield to the event loop instead of blocking it between chunks
+                    async for line in response.content:
+                        if line.strip():
+                            data = orjson.loads(line)
+                            if 'response' in data:
+                                yield data['response']
+                            if data.get('done', False):
+                                break
                         
         except Exception as e:
             raise Exception(f"Ollama streaming failed: {e}")
     
     async def _stream_openai(self, prompt: str) -> AsyncGenerator[str, None]:
         """Stream response from OpenAI"""
+        # The stream runs on the client's loop and hands chunks to this one through a queue
+        caller_loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        done = object()
+        
+        async def pump():
+            try:
+                stream = await self.openai_client.chat.completions.create(
+                    model=self.openai_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=1000,
+                    temperature=0.7,
+                    stream=True
+                )
+                
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        caller_loop.call_soon_threadsafe(chunks.put_nowait, chunk.choices[0].delta.content)
+            finally:
+                caller_loop.call_soon_threadsafe(chunks.put_nowait, done)
+        
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
         try:
-            stream = await self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1000,
-                temperature=0.7,
-                stream=True
-            )
-            
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
-                    
+            while (chunk := await chunks.get()) is not done:
+                yield chunk
+            future.result()
         except Exception as e:
             raise Exception(f"OpenAI streaming failed: {e}")
+        finally:
+            future.cancel()  # No-op once finished; stops the stream if the consumer left early
     
-    def generate(self, prompt: str, callback=None) -> Optional[LLMResponse]:
-        """Generate response with optional callback for async processing"""
+    def generate(self, prompt: str, callback=None, system_prompt: Optional[str] = None,
+                 json_mode: bool = False) -> Optional[LLMResponse]:
+        """Generate response with optional callback for async processing; json_mode requests a JSON object"""
         if callback:
             # Add to queue for async processing
             request_id = f"req_{int(time.time() * 1000)}"
-            self.request_queue.add_request(request_id, prompt, callback)
+            self.request_queue.add_request(request_id, prompt, callback, system_prompt, json_mode)
             return None
         else:
             # Synchronous processing
-            return self._process_single_request(prompt)
+            return self._process_single_request(prompt, system_prompt, json_mode)
+    
+    async def agenerate(self, prompt: str, system_prompt: Optional[str] = None, json_mode: bool = False) -> LLMResponse:
+        """Generate a response without blocking the event loop, using the same local/fallback logic"""
+        start_time = time.time()
+        
+        # Ollama is called through blocking requests, so run it in a worker thread
+        transient = False
+        try:
+            response = await asyncio.to_thread(self._call_ollama, prompt, system_prompt, json_mode)
+            if response.success:
+                self._update_local_metrics(response.response_time)
+                return response
+        except Exception as e:
+            logger.warning(f"Local model failed: {e}")
+            transient = _is_transient(e)
+        
+        # Fallback to OpenAI if available
+        if self.openai_available:
+            try:
+                response = await self._acall_openai(prompt, system_prompt, json_mode)
+                self.fallback_usage_count += 1
+                return response
+            except Exception as e:
+                logger.error(f"OpenAI fallback failed: {e}")
+                transient = transient or _is_transient(e)
+        
+        return LLMResponse(
+            content="",
+            model_used="none",
+            tokens_used=0,
+            response_time=time.time() - start_time,
+            success=False,
+            error_message="Both local and OpenAI models failed",
+            transient=transient
+        )
     
     def get_stats(self) -> Dict[str, Any]:
         """Get performance statistics"""
-        avg_local_time = sum(self.local_response_times) / len(self.local_response_times) if self.local_response_times else 0
+        with self._metrics_lock:
+            local_response_times = list(self.local_response_times)
+        avg_local_time = sum(local_response_times) / len(local_response_times) if local_response_times else 0
         
         return {
             "local_success_rate": self.local_success_rate,
@@ -334,7 +503,7 @@ class LLMWrapper:
         
         # Check local model
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+            response = self._http.get(f"{self.ollama_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 health["local_available"] = any(
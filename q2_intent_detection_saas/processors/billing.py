@@ -3,15 +3,90 @@ Billing/Account Processor
 Handles billing queries with pricing tables and policies
 """
 
-import json
+import asyncio
 import logging
 import os
-from typing import Dict, List, Optional
+import random
+import re
+import time
+import weakref
+import orjson
+from typing import Dict, List, Optional, Set
 from dataclasses import dataclass
-from llm_wrapper import LLMWrapper
+from functools import cached_property, lru_cache
+from threading import Lock
+from llm_wrapper import LLMWrapper, LLMResponse, parse_batch_answers
 
 logger = logging.getLogger(__name__)
 
+# Whole-word keywords identifying each billing query type, checked in priority order
+_CATEGORY_KEYWORDS = {
+    "pricing": frozenset({"price", "prices", "priced", "pricing", "cost", "costs", "plan", "plans",
+                          "tier", "tiers", "subscription", "subscriptions"}),
+    "cancellation": frozenset({"cancel", "cancels", "cancelled", "canceled", "cancelling",
+                               "canceling", "cancellation", "cancellations", "cancelation",
+                               "stop", "stops", "stopped", "stopping", "end"}),
+    "refund": frozenset({"refund", "refunds", "refunded", "refunding", "refundable", "nonrefundable",
+                         "return", "returns", "returned", "returning"}),
+    "plan_change": frozenset({"upgrade", "upgrades", "upgraded", "upgrading",
+                              "downgrade", "downgrades", "downgraded", "downgrading"}),
+    "billing": frozenset({"bill", "bills", "billing", "billed", "invoice", "invoices", "invoiced",
+                          "payment", "payments", "charge", "charges", "charged", "charging"})
+}
+
+# Multi-word keywords, matched as substrings only when no single word hit
+_CATEGORY_PHRASES = (
+    ("refund", "money back"),
+    ("plan_change", "change plan")
+)
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+# Static parts of the billing system prompt, around the rendered pricing context
+SYSTEM_PROMPT_HEAD = """You are a billing support specialist for a SaaS platform.
+
+Pricing Information:
+"""
+SYSTEM_PROMPT_TAIL = """
+
+Provide a helpful, clear response to the customer query that:
+1. Directly addresses the customer's question
+2. Includes relevant pricing information if applicable
+3. Explains any policies or procedures
+4. Is professional and customer-friendly
+
+A plan table, next steps, policy links and contact details are attached to your answer
+automatically, so do not repeat them. Keep the response concise but informative."""
+
+# Query types whose canned answer is what the LLM would say anyway
+DEFAULT_LLM_SKIP_TYPES = frozenset({"cancellation", "refund"})
+
+# LLM calls per response before falling back to the canned answer; only transient
+# failures (timeouts, connection and server errors) are retried
+LLM_ATTEMPTS = 3
+
+def _retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: up to 0.5s, 1s, 2s... capped at 4s"""
+    return random.uniform(0, min(4.0, 0.5 * 2 ** attempt))
+
+# Next steps for query types without a matching policy
+DEFAULT_NEXT_STEPS = ["Log into your account dashboard", "Contact support if you need further assistance"]
+
+
+def _parse_price_cents(price: str) -> Optional[int]:
+    """Parse a "$29/month" style price into integer cents"""
+    try:
+        return int(round(float(price.strip().lstrip("$").split("/")[0].replace(",", "")) * 100))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4)
+def _load_kb_cached(path: str, mtime: float) -> Dict:
+    """Parse a knowledge base file, shared by every processor until the file changes"""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
 @dataclass
 class BillingResponse:
     """Billing response with structured information"""
@@ -24,24 +99,55 @@ class BillingResponse:
 class BillingProcessor:
     """Processor for billing and account queries"""
     
-    def __init__(self, llm_wrapper: LLMWrapper):
+    def __init__(self, llm_wrapper: LLMWrapper, llm_skip_types: Optional[Set[str]] = None):
         self.llm = llm_wrapper
         
-        # Load billing knowledge base
-        self.knowledge_base = self._load_billing_kb()
+        # Query types answered with the canned response, without an LLM call
+        self.llm_skip_types = set(DEFAULT_LLM_SKIP_TYPES if llm_skip_types is None else llm_skip_types)
+        
+        # The knowledge base and everything extracted from it load on first access
+        # (see the cached properties below), so idle processors never touch the disk
         
-        # Extract pricing and policy information from knowledge base
-        self.pricing_plans = self._extract_pricing_plans()
-        self.policies = self._extract_policies()
-        self.contact_info = self._extract_contact_info()
+        # Derived from pricing_plans on first use, see _invalidate_cache
+        self._pricing_context: Optional[str] = None
+        self._system_prompt: Optional[str] = None
+    
+    @cached_property
+    def knowledge_base(self) -> Dict:
+        """Billing knowledge base"""
+        return self._load_billing_kb()
+    
+    @cached_property
+    def pricing_plans(self) -> Dict:
+        """Pricing plans from the knowledge base"""
+        return self._extract_pricing_plans()
+    
+    @cached_property
+    def _monthly_cents(self) -> Dict[str, Optional[int]]:
+        """Monthly price of each plan in integer cents, None when it isn't a dollar amount"""
+        return {plan: _parse_price_cents(data.get("price", "")) for plan, data in self.pricing_plans.items()}
+    
+    @cached_property
+    def policies(self) -> Dict:
+        """Billing policies from the knowledge base"""
+        return self._extract_policies()
+    
+    @cached_property
+    def contact_info(self) -> Dict:
+        """Support contacts from the knowledge base"""
+        return self._extract_contact_info()
+    
+    @cached_property
+    def _contact_block(self) -> str:
+        """Contact section of formatted responses"""
+        return self._render_contact_block(self.contact_info)
     
     def _load_billing_kb(self) -> Dict:
         """Load billing knowledge base from JSON file"""
         try:
             kb_path = os.path.join("data", "billing_kb.json")
             if os.path.exists(kb_path):
-                with open(kb_path, 'r') as f:
-                    kb_data = json.load(f)
+                kb_data = _load_kb_cached(kb_path, os.stat(kb_path).st_mtime)
                 logger.info("Billing knowledge base loaded successfully")
                 return kb_data
             else:
@@ -131,78 +237,214 @@ class BillingProcessor:
         query_lower = query.lower()
         
         # Identify the type of billing query
-        query_type = self._identify_query_type(query_lower)
+        query_type = self._identify_query_type(set(_TOKEN_RE.findall(query_lower)), query_lower)
+        
+        # Generate response using LLM, unless the canned answer already covers this type
+        if query_type in self.llm_skip_types:
+            llm_response = self._get_fallback_response(query_type)
+        else:
+            llm_response = self._generate_llm_response(query, query_type)
+        
+        return self._build_response(llm_response, query_type)
+    
+    async def process_query_async(self, query: str, context: Optional[Dict] = None) -> BillingResponse:
+        """Process billing/account query, awaiting the LLM so other work can run meanwhile"""
+        query_lower = query.lower()
+        query_type = self._identify_query_type(set(_TOKEN_RE.findall(query_lower)), query_lower)
+        if query_type in self.llm_skip_types:
+            llm_response = self._get_fallback_response(query_type)
+        else:
+            llm_response = await self._agenerate_llm_response(query, query_type)
+        return self._build_response(llm_response, query_type)
+    
+    def process_queries(self, queries: List[str], max_batch: int = 8) -> List[BillingResponse]:
+        """Process many billing queries, answering up to max_batch queries of one type per LLM call"""
+        lowered = [query.lower() for query in queries]
+        query_types = [self._identify_query_type(set(_TOKEN_RE.findall(q)), q) for q in lowered]
+        answers: List[Optional[str]] = [None] * len(queries)
         
-        # Generate response using LLM
-        llm_response = self._generate_llm_response(query, query_type)
+        indices_by_type: Dict[str, List[int]] = {}
+        for i, query_type in enumerate(query_types):
+            if query_type in self.llm_skip_types:
+                answers[i] = self._get_fallback_response(query_type)
+            else:
+                indices_by_type.setdefault(query_type, []).append(i)
+        
+        # Larger batches save calls but degrade per-answer quality, hence the cap
+        for query_type, indices in indices_by_type.items():
+            for start in range(0, len(indices), max_batch):
+                chunk = indices[start:start + max_batch]
+                batch_answers = self._generate_batch_llm_response([queries[i] for i in chunk], query_type)
+                for i, answer in zip(chunk, batch_answers):
+                    answers[i] = answer
         
+        return [self._build_response(answer, query_type) for answer, query_type in zip(answers, query_types)]
+    
+    def _build_response(self, answer: str, query_type: str) -> BillingResponse:
+        """Attach the pricing and policy information for a query type to an answer"""
         # Get relevant pricing and policy information
         pricing_info = self._get_pricing_info(query_type)
         policy_links = self._get_policy_links(query_type)
         next_steps = self._get_next_steps(query_type)
         
         return BillingResponse(
-            answer=llm_response,
+            answer=answer,
             pricing_info=pricing_info,
             policy_links=policy_links,
             next_steps=next_steps,
             contact_info=self.contact_info
         )
     
-    def _identify_query_type(self, query: str) -> str:
+    def _identify_query_type(self, tokens: Set[str], query_lower: str) -> str:
         """Identify the type of billing query"""
-        if any(word in query for word in ["price", "cost", "plan", "tier", "subscription"]):
-            return "pricing"
-        elif any(word in query for word in ["cancel", "cancellation", "stop", "end"]):
-            return "cancellation"
-        elif any(word in query for word in ["refund", "money back", "return"]):
-            return "refund"
-        elif any(word in query for word in ["upgrade", "downgrade", "change plan"]):
-            return "plan_change"
-        elif any(word in query for word in ["billing", "invoice", "payment", "charge"]):
-            return "billing"
-        else:
-            return "general"
+        # Whole-word set probes in priority order, so "weekend" no longer reads as "end"
+        for query_type, keywords in _CATEGORY_KEYWORDS.items():
+            if not tokens.isdisjoint(keywords):
+                return query_type
+        for query_type, phrase in _CATEGORY_PHRASES:
+            if phrase in query_lower:
+                return query_type
+        return "general"
     
     def _generate_llm_response(self, query: str, query_type: str) -> str:
         """Generate LLM response for billing query"""
-        pricing_context = self._get_pricing_context()
-        
-        prompt = f"""You are a billing support specialist for a SaaS platform.
+        prompt = self._build_query_prompt(query, query_type)
 
-Customer Query: "{query}"
+        try:
+            # Static instructions and pricing go in the system prompt so the provider can
+            # cache the prefix; only the query and its type change between calls
+            system_prompt = self._build_system_prompt()
+            response = self._call_llm(prompt, system_prompt, json_mode=True)
+            if response and response.success:
+                return self._extract_answer(response.content)
+            else:
+                return self._get_fallback_response(query_type)
+        except Exception as e:
+            logger.error(f"LLM response generation failed: {e}")
+            return self._get_fallback_response(query_type)
+    
+    async def _agenerate_llm_response(self, query: str, query_type: str) -> str:
+        """Generate LLM response for billing query without blocking the event loop"""
+        prompt = self._build_query_prompt(query, query_type)
+        
+        try:
+            system_prompt = self._build_system_prompt()
+            response = await self._acall_llm(prompt, system_prompt, json_mode=True)
+            if response and response.success:
+                return self._extract_answer(response.content)
+            else:
+                return self._get_fallback_response(query_type)
+        except Exception as e:
+            logger.error(f"LLM response generation failed: {e}")
+            return self._get_fallback_response(query_type)
+    
+    def _build_query_prompt(self, query: str, query_type: str) -> str:
+        """Build the per-query user message"""
+        return f"""Customer Query: "{query}"
 
 Query Type: {query_type}
 
-Pricing Information:
-{pricing_context}
+Respond with only a JSON object of the form {{"answer": "<response>"}}."""
+    
+    @staticmethod
+    def _extract_answer(content: str) -> str:
+        """Take the answer out of a JSON reply, keeping the raw text if the model ignored the format"""
+        try:
+            reply = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content
+        if isinstance(reply, dict) and isinstance(reply.get("answer"), str):
+            return reply["answer"]
+        return content
+    
+    def _call_llm(self, prompt: str, system_prompt: str, json_mode: bool = False) -> Optional[LLMResponse]:
+        """Call the LLM, retrying transient failures with jittered exponential backoff"""
+        for attempt in range(LLM_ATTEMPTS):
+            # The wrapper reports failures in the response rather than raising
+            response = self.llm.generate(prompt, system_prompt=system_prompt, json_mode=json_mode)
+            if response and response.success:
+                logger.info(f"Billing LLM call: {response.model_used}, {response.tokens_used} tokens, {response.response_time:.2f}s")
+                return response
+            if not (response and response.transient) or attempt == LLM_ATTEMPTS - 1:
+                return response  # Permanent failures would fail the same way again
+            logger.warning(f"Billing LLM call failed (attempt {attempt + 1}): {response.error_message}")
+            time.sleep(_retry_delay(attempt))
+    
+    async def _acall_llm(self, prompt: str, system_prompt: str, json_mode: bool = False) -> Optional[LLMResponse]:
+        """Async _call_llm, awaiting both the LLM and the backoff"""
+        for attempt in range(LLM_ATTEMPTS):
+            # The wrapper reports failures in the response rather than raising
+            response = await self.llm.agenerate(prompt, system_prompt=system_prompt, json_mode=json_mode)
+            if response and response.success:
+                logger.info(f"Billing LLM call: {response.model_used}, {response.tokens_used} tokens, {response.response_time:.2f}s")
+                return response
+            if not (response and response.transient) or attempt == LLM_ATTEMPTS - 1:
+                return response  # Permanent failures would fail the same way again
+            logger.warning(f"Billing LLM call failed (attempt {attempt + 1}): {response.error_message}")
+            await asyncio.sleep(_retry_delay(attempt))
+    
+    def _generate_batch_llm_response(self, queries: List[str], query_type: str) -> List[str]:
+        """Generate LLM responses for several queries of one type in a single call"""
+        if len(queries) == 1:
+            return [self._generate_llm_response(queries[0], query_type)]
+        
+        numbered = "\n".join(f'[{n}] "{query}"' for n, query in enumerate(queries, 1))
+        prompt = f"""Customer Queries:
+{numbered}
 
-Provide a helpful, clear response that:
-1. Directly addresses the customer's question
-2. Includes relevant pricing information if applicable
-3. Explains any policies or procedures
-4. Provides clear next steps
-5. Is professional and customer-friendly
+Query Type: {query_type}
 
-Keep the response concise but informative."""
+Answer each query separately. Respond with only a JSON array of objects of the form {{"id": <query number>, "answer": "<response>"}}."""
 
         try:
-            response = self.llm.generate(prompt)
-            if response and response.success:
-                return response.content
-            else:
-                return self._get_fallback_response(query_type)
+            system_prompt = self._build_system_prompt()
+            response = self._call_llm(prompt, system_prompt)
+            if not response or not response.success:
+                return [self._get_fallback_response(query_type)] * len(queries)
+            answers = parse_batch_answers(response.content, len(queries))
         except Exception as e:
-            logger.error(f"LLM response generation failed: {e}")
-            return self._get_fallback_response(query_type)
+            logger.error(f"Batch LLM response generation failed: {e}")
+            return [self._get_fallback_response(query_type)] * len(queries)
+        
+        # Queries the batch reply skipped or garbled get their own call
+        return [
+            answer if answer else self._generate_llm_response(query, query_type)
+            for query, answer in zip(queries, answers)
+        ]
+    
+    def _build_system_prompt(self) -> str:
+        """Get the static system prompt shared by every billing query, built once"""
+        if self._system_prompt is None:
+            self._system_prompt = "".join(
+                (SYSTEM_PROMPT_HEAD, self._get_pricing_context(), SYSTEM_PROMPT_TAIL)
+            )
+        return self._system_prompt
     
     def _get_pricing_context(self) -> str:
-        """Get pricing context for LLM"""
-        context = "Available Plans:\n"
+        """Get pricing context for LLM, built once since the plans don't change"""
+        if self._pricing_context is None:
+            self._pricing_context = self._build_pricing_context()
+        return self._pricing_context
+    
+    def _build_pricing_context(self) -> str:
+        """Render the pricing plans for the LLM prompt"""
+        lines = ["Available Plans:"]
         for plan_id, plan in self.pricing_plans.items():
-            context += f"- {plan['name']}: {plan['price']} ({plan['annual_price']})\n"
-            context += f"  Features: {', '.join(plan['features'][:3])}\n"
-        return context
+            # Display name and annual price are optional in the knowledge base
+            line = f"- {plan.get('name', plan_id.title())}: {plan['price']}"
+            if plan.get("annual_price"):
+                line += f" ({plan['annual_price']})"
+            lines.append(line)
+            lines.append(f"  Features: {', '.join(plan['features'][:3])}")
+        return "\n".join(lines) + "\n"
+    
+    def _invalidate_cache(self):
+        """Recompute values derived from the knowledge base after pricing_plans or policies change"""
+        self._pricing_context = None
+        self._system_prompt = None
+        for name in ("_pricing_info_by_type", "_policy_links_by_type", "_next_steps_by_type",
+                     "_monthly_cents", "_plan_comparison"):
+            self.__dict__.pop(name, None)
     
     def _get_fallback_response(self, query_type: str) -> str:
         """Get fallback response when LLM fails"""
@@ -219,43 +461,64 @@ Keep the response concise but informative."""
     
     def _get_pricing_info(self, query_type: str) -> Dict[str, any]:
         """Get relevant pricing information"""
-        if query_type == "pricing":
-            return self.pricing_plans
-        elif query_type in ["upgrade", "downgrade", "plan_change"]:
-            return {k: v for k, v in self.pricing_plans.items() if k in ["pro", "enterprise"]}
-        else:
-            return {}
+        return self._pricing_info_by_type.get(query_type, {})
     
     def _get_policy_links(self, query_type: str) -> List[str]:
         """Get relevant policy links"""
-        if query_type == "cancellation":
-            return [self.policies["cancellation"]["link"]]
-        elif query_type == "refund":
-            return [self.policies["refund"]["link"]]
-        elif query_type in ["upgrade", "downgrade", "plan_change"]:
-            return [self.policies["upgrade"]["link"], self.policies["downgrade"]["link"]]
-        else:
-            return []
+        return self._policy_links_by_type.get(query_type, [])
     
     def _get_next_steps(self, query_type: str) -> List[str]:
         """Get next steps for the customer"""
-        if query_type == "cancellation":
-            return self.policies["cancellation"]["steps"]
-        elif query_type == "refund":
-            return self.policies["refund"]["steps"]
-        elif query_type == "upgrade":
-            return self.policies["upgrade"]["steps"]
-        elif query_type == "downgrade":
-            return self.policies["downgrade"]["steps"]
-        else:
-            return ["Log into your account dashboard", "Contact support if you need further assistance"]
+        return self._next_steps_by_type.get(query_type, DEFAULT_NEXT_STEPS)
+    
+    @cached_property
+    def _pricing_info_by_type(self) -> Dict[str, Dict]:
+        """Pricing info per query type"""
+        plan_change_pricing = {k: v for k, v in self.pricing_plans.items() if k in ["pro", "enterprise"]}
+        return {
+            "pricing": self.pricing_plans,
+            "upgrade": plan_change_pricing,
+            "downgrade": plan_change_pricing,
+            "plan_change": plan_change_pricing
+        }
+    
+    @cached_property
+    def _policy_links_by_type(self) -> Dict[str, List[str]]:
+        """Policy links per query type"""
+        # Policies missing from the knowledge base are skipped here rather than
+        # raising KeyError when a customer asks about them
+        def links(*names):
+            return [self.policies[name]["link"] for name in names if name in self.policies]
+        
+        plan_change_links = links("upgrade", "downgrade")
+        return {
+            "cancellation": links("cancellation"),
+            "refund": links("refund"),
+            "upgrade": plan_change_links,
+            "downgrade": plan_change_links,
+            "plan_change": plan_change_links
+        }
+    
+    @cached_property
+    def _next_steps_by_type(self) -> Dict[str, List[str]]:
+        """Next steps per query type that has a policy"""
+        return {
+            name: self.policies[name]["steps"]
+            for name in ("cancellation", "refund", "upgrade", "downgrade")
+            if name in self.policies
+        }
     
     def get_plan_comparison(self) -> Dict[str, any]:
         """Get plan comparison table"""
+        return self._plan_comparison
+    
+    @cached_property
+    def _plan_comparison(self) -> Dict[str, any]:
+        """Plan comparison table, built once per set of pricing plans"""
         comparison = {
             "plans": list(self.pricing_plans.keys()),
             "prices": {plan: data["price"] for plan, data in self.pricing_plans.items()},
-            "annual_prices": {plan: data["annual_price"] for plan, data in self.pricing_plans.items()},
+            "annual_prices": {plan: data.get("annual_price") for plan, data in self.pricing_plans.items()},
             "features": {plan: data["features"] for plan, data in self.pricing_plans.items()},
             "limits": {plan: data["limits"] for plan, data in self.pricing_plans.items()}
         }
@@ -267,19 +530,24 @@ Keep the response concise but informative."""
             return {"error": "Plan not found"}
         
         plan_data = self.pricing_plans[plan]
-        monthly_price = float(plan_data["price"].replace("$", "").replace("/month", ""))
+        monthly_cents = self._monthly_cents[plan]
         
-        if months == 12:
-            annual_price = plan_data["annual_price"]
+        # Plans without a listed annual price are billed monthly for the year
+        annual_price = plan_data.get("annual_price") if months == 12 else None
+        
+        if annual_price:
             if "Contact sales" in annual_price:
                 total = "Contact sales for annual pricing"
             else:
                 total = annual_price
+        elif monthly_cents is None:
+            total = "Contact sales for custom pricing"
         else:
-            total = f"${monthly_price * months:.2f}"
+            total_cents = monthly_cents * months
+            total = f"${total_cents // 100}.{total_cents % 100:02d}"
         
         return {
-            "plan": plan_data["name"],
+            "plan": plan_data.get("name", plan.title()),
             "monthly_cost": plan_data["price"],
             "total_cost": total,
             "months": months
@@ -287,29 +555,55 @@ Keep the response concise but informative."""
     
     def format_response(self, response: BillingResponse) -> str:
         """Format billing response for display"""
-        formatted = f"{response.answer}\n\n"
+        parts = [response.answer, "\n\n"]
         
         if response.pricing_info:
-            formatted += "**Pricing Information:**\n"
-            for plan_id, plan_data in response.pricing_info.items():
-                formatted += f"- {plan_data['name']}: {plan_data['price']}\n"
-            formatted += "\n"
+            parts.append("**Pricing Information:**\n")
+            parts.extend(
+                f"- {plan_data.get('name', plan.title())}: {plan_data['price']}\n"
+                for plan, plan_data in response.pricing_info.items()
+            )
+            parts.append("\n")
         
         if response.next_steps:
-            formatted += "**Next Steps:**\n"
-            for i, step in enumerate(response.next_steps, 1):
-                formatted += f"{i}. {step}\n"
-            formatted += "\n"
+            parts.append("**Next Steps:**\n")
+            parts.extend(f"{i}. {step}\n" for i, step in enumerate(response.next_steps, 1))
+            parts.append("\n")
         
         if response.policy_links:
-            formatted += "**Related Policies:**\n"
-            for link in response.policy_links:
-                formatted += f"- {link}\n"
-            formatted += "\n"
+            parts.append("**Related Policies:**\n")
+            parts.extend(f"- {link}\n" for link in response.policy_links)
+            parts.append("\n")
         
-        formatted += "**Contact Information:**\n"
-        formatted += f"- Billing Support: {response.contact_info['billing_support']}\n"
-        formatted += f"- Phone: {response.contact_info['phone']}\n"
-        formatted += f"- Hours: {response.contact_info['hours']}\n"
+        # Responses built by this processor share its contact info, rendered once
+        if response.contact_info is self.contact_info:
+            parts.append(self._contact_block)
+        else:
+            parts.append(self._render_contact_block(response.contact_info))
         
-        return formatted 
\ No newline at end of file
+        return "".join(parts)
+    
+    @staticmethod
+    def _render_contact_block(contact_info: Dict[str, str]) -> str:
+        """Render the contact information section of a formatted response"""
+        return (
+            "**Contact Information:**\n"
+            f"- Billing Support: {contact_info['billing_support']}\n"
+            f"- Phone: {contact_info['phone']}\n"
+            f"- Hours: {contact_info['hours']}\n"
+        )
+
+# One shared processor per LLM wrapper, see get_billing_processor. The processor holds its
+# wrapper, so it is referenced weakly too; otherwise neither entry side could ever be freed
+_PROCESSOR_CACHE: "weakref.WeakKeyDictionary[LLMWrapper, weakref.ref[BillingProcessor]]" = weakref.WeakKeyDictionary()
+_PROCESSOR_CACHE_LOCK = Lock()
+
+def get_billing_processor(llm_wrapper: LLMWrapper) -> BillingProcessor:
+    """Get the shared billing processor for an LLM wrapper, creating it on first use"""
+    with _PROCESSOR_CACHE_LOCK:
+        processor_ref = _PROCESSOR_CACHE.get(llm_wrapper)
+        processor = processor_ref() if processor_ref is not None else None
+        if processor is None:
+            processor = BillingProcessor(llm_wrapper)
+            _PROCESSOR_CACHE[llm_wrapper] = weakref.ref(processor)
+        return processor
@@ -3,20 +3,157 @@ Feature Request Processor
 Handles feature requests with roadmap and comparison data
 """
 
-import json
 import logging
 import os
-from typing import Dict, List, Optional
-from dataclasses import dataclass
-from llm_wrapper import LLMWrapper
+import orjson
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from llm_wrapper import LLMWrapper, parse_batch_answers
 
 logger = logging.getLogger(__name__)
 
+# Specific features checked after the keyword categories, in priority order
+SPECIFIC_FEATURE_KEYWORDS = (
+    ("ui_ux", ("dark mode", "theme", "color")),
+    ("integration", ("export", "import", "backup")),
+    ("integration", ("notification", "alert", "email"))
+)
+
+# Static parts of the feature request prompt, around the query and its per-type context
+PROMPT_HEAD = """You are a product manager for a SaaS platform handling feature requests.
+
+"""
+PROMPT_TAIL = """
+
+Provide a helpful, encouraging response that:
+1. Acknowledges the feature request
+2. Explains current status and timeline if applicable
+3. Mentions alternatives or workarounds
+4. Encourages voting on the feature request portal
+5. Is positive and shows we value customer input
+
+Keep the response friendly and informative."""
+BATCH_PROMPT_TAIL = PROMPT_TAIL + """ Answer each query separately. Respond with only a JSON array of objects of the form {"id": <query number>, "answer": "<response>"}."""
+
+# Workarounds suggested for each feature type while the feature isn't available
+ALTERNATIVES = {
+    "mobile": [
+        "Use our responsive web API in mobile browsers",
+        "Integrate with our REST API in native apps",
+        "Use third-party mobile SDK wrappers"
+    ],
+    "analytics": [
+        "Export data and analyze in external tools",
+        "Use our basic analytics in Pro plan",
+        "Set up custom tracking with webhooks"
+    ],
+    "integration": [
+        "Use our webhook system for real-time updates",
+        "Set up scheduled API calls for data sync",
+        "Use our REST API for custom integrations"
+    ],
+    "security": [
+        "Use API key authentication",
+        "Implement IP whitelisting",
+        "Set up audit logging"
+    ],
+    "ui_ux": [
+        "Use our current interface with custom CSS",
+        "Integrate our API into your own UI",
+        "Use our webhook system for custom notifications"
+    ]
+}
+DEFAULT_ALTERNATIVES = ["Check our documentation for current capabilities", "Contact our sales team for custom solutions"]
+
+# Canned answers used when the LLM is unavailable
+FALLBACK_RESPONSES = {
+    "mobile": "Thank you for requesting mobile SDK features! We're actively working on mobile support and it's planned for Q4 2024. In the meantime, our web API works great on mobile browsers. Please vote for mobile features on our portal to help prioritize development.",
+    "analytics": "We appreciate your interest in advanced analytics! We're planning to enhance our analytics capabilities in Q2 2024. Currently, we offer basic analytics in our Pro plan. Please vote for analytics features to help us understand your specific needs.",
+    "integration": "Thanks for the integration request! We're continuously adding new integrations and webhook capabilities. Check our roadmap for upcoming features, and please vote for specific integrations you need.",
+    "security": "Security is a top priority for us. We're planning several security enhancements in Q3 2024. Please vote for security features and let us know your specific requirements.",
+    "ui_ux": "We're always working to improve our user interface and experience. Custom branding options are planned for Q3 2024. Please vote for UI/UX features to help us prioritize improvements.",
+    "general": "Thank you for your feature request! We value all customer feedback and use it to prioritize our development roadmap. Please visit our feature request portal to vote for this feature and see our current roadmap."
+}
+
+# Roadmap sections that are searched for features matching a feature type
+ROADMAP_SECTIONS = (
+    ("current_in_progress", "current_quarter", "in_progress"),
+    ("current_planned", "current_quarter", "planned"),
+    ("next_planned", "next_quarter", "planned")
+)
+
+@dataclass(slots=True, frozen=True)
+class _RoadmapFeature:
+    """Roadmap entry with its defaults filled in and lowercased text for matching"""
+    name: str
+    desc: str
+    progress: str
+    eta: str
+    name_lower: str
+    desc_lower: str
+    
+    @classmethod
+    def from_dict(cls, feature: Dict) -> "_RoadmapFeature":
+        """Normalize a roadmap entry from the knowledge base"""
+        desc = feature.get("description", "")
+        return cls(
+            name=feature["feature"],
+            desc=desc,
+            progress=feature.get("progress", "Unknown"),
+            eta=feature.get("eta", "Unknown"),
+            name_lower=feature["feature"].lower(),
+            desc_lower=desc.lower()
+        )
+
 @dataclass
+class _SharedKnowledgeBase:
+    """A prepared roadmap knowledge base and the per-feature-type tables derived from it"""
+    data: Dict
+    roadmap_features: Dict[str, List[_RoadmapFeature]]
+    # (competitor, [(feature, lowered feature)]) for features competitors have and we lack
+    competitor_gaps: List[Tuple[str, List[Tuple[str, str]]]]
+    # (advantage, lowered advantage) pairs from the market positioning
+    our_advantages: List[Tuple[str, str]]
+    roadmap_index: Dict[str, Dict[str, List[_RoadmapFeature]]] = field(default_factory=dict)
+    competitor_index: Dict[str, Tuple[List[Tuple[str, List[str]]], List[str]]] = field(default_factory=dict)
+    roadmap_info_by_type: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    prompt_context_by_type: Dict[str, str] = field(default_factory=dict)
+
+def _prepare_kb(kb_data: Dict) -> _SharedKnowledgeBase:
+    """Normalize the roadmap sections and lowercase the competitor text matched on every query"""
+    roadmap = kb_data.get("roadmap", {})
+    roadmap_features = {
+        section: [_RoadmapFeature.from_dict(feature) for feature in roadmap.get(quarter, {}).get(status, [])]
+        for section, quarter, status in ROADMAP_SECTIONS
+    }
+    
+    competitor_analysis = kb_data.get("competitor_analysis", {})
+    competitor_gaps = [
+        (competitor_name, [(feature, feature.lower()) for feature in competitor_data["features_we_lack"]])
+        for competitor_name, competitor_data in competitor_analysis.get("competitors", {}).items()
+        if "features_we_lack" in competitor_data
+    ]
+    our_advantages = [
+        (adv, adv.lower())
+        for adv in competitor_analysis.get("market_positioning", {}).get("our_advantages", [])
+    ]
+    
+    return _SharedKnowledgeBase(kb_data, roadmap_features, competitor_gaps, our_advantages)
+
+@lru_cache(maxsize=4)
+def _load_kb_cached(path: str, mtime: float) -> _SharedKnowledgeBase:
+    """Parse and prepare a roadmap file, shared by every processor until the file changes"""
+    with open(path, 'rb') as f:
+        return _prepare_kb(orjson.loads(f.read()))
+
+@dataclass(slots=True, frozen=True)
 class FeatureResponse:
     """Feature request response with structured information"""
     response: str
-    roadmap_info: Dict[str, any]
+    roadmap_info: Dict[str, Any]
     alternatives: List[str]
     voting_info: Dict[str, str]
     contact_info: Dict[str, str]
@@ -24,42 +161,84 @@ class FeatureResponse:
 class FeatureRequestProcessor:
     """Processor for feature request queries"""
     
-    def __init__(self, llm_wrapper: LLMWrapper):
+    __slots__ = (
+        "llm", "cache_size", "_response_cache", "_cache_lock",
+        "knowledge_base", "roadmap", "competitor_features", "voting_info", "contact_info", "_contact_block",
+        "feature_categories", "_keyword_table", "_feature_type_cache",
+        "_roadmap_features", "_competitor_gaps", "_our_advantages", "_roadmap_index", "_competitor_index", "_roadmap_info_by_type", "_prompt_context_by_type"
+    )
+    
+    def __init__(self, llm_wrapper: LLMWrapper, cache_size: int = 1024):
         self.llm = llm_wrapper
         
-        # Load feature roadmap knowledge base
-        self.knowledge_base = self._load_feature_kb()
+        # LRU of LLM answers keyed by (normalized query, feature type)
+        self.cache_size = cache_size
+        self._response_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._cache_lock = Lock()
+        
+        # Load feature roadmap knowledge base, shared with other processors along with
+        # the per-type tables below
+        shared_kb = self._load_feature_kb()
+        self.knowledge_base = shared_kb.data
         
         # Extract roadmap and other information from knowledge base
         self.roadmap = self._extract_roadmap()
         self.competitor_features = self._extract_competitor_features()
         self.voting_info = self._extract_voting_info()
         self.contact_info = self._extract_contact_info()
+        self._contact_block = self._render_contact_block(self.contact_info)
         
         # Common feature categories
         self.feature_categories = {
-            "mobile": ["mobile app", "ios", "android", "sdk", "native"],
-            "analytics": ["analytics", "dashboard", "reporting", "metrics", "insights"],
-            "integration": ["webhook", "api", "third-party", "connector", "plugin"],
-            "security": ["authentication", "encryption", "sso", "security", "compliance"],
-            "ui_ux": ["interface", "design", "branding", "customization", "theme"]
+            "mobile": ("mobile app", "ios", "android", "sdk", "native"),
+            "analytics": ("analytics", "dashboard", "reporting", "metrics", "insights"),
+            "integration": ("webhook", "api", "third-party", "connector", "plugin"),
+            "security": ("authentication", "encryption", "sso", "security", "compliance"),
+            "ui_ux": ("interface", "design", "branding", "customization", "theme")
         }
+        
+        # Every keyword paired with its category in match priority order: the categories
+        # above first, then the specific features that only count when none of them hit
+        self._keyword_table = tuple(
+            (keyword, category)
+            for category, keywords in self.feature_categories.items()
+            for keyword in keywords
+        ) + tuple(
+            (keyword, category)
+            for category, keywords in SPECIFIC_FEATURE_KEYWORDS
+            for keyword in keywords
+        )
+        
+        # The type depends only on the query text, so repeated requests reuse it
+        self._feature_type_cache = lru_cache(maxsize=4096)(self._match_feature_type)
+        
+        # Roadmap and competitor matches per feature type, filled for every type the
+        # classifier can return so queries only format what was matched here
+        self._roadmap_features = shared_kb.roadmap_features
+        self._competitor_gaps = shared_kb.competitor_gaps
+        self._our_advantages = shared_kb.our_advantages
+        self._roadmap_index = shared_kb.roadmap_index
+        self._competitor_index = shared_kb.competitor_index
+        self._roadmap_info_by_type = shared_kb.roadmap_info_by_type
+        self._prompt_context_by_type = shared_kb.prompt_context_by_type
+        for feature_type in (*self.feature_categories, "general"):
+            self._get_roadmap_matches(feature_type)
+            self._get_competitor_matches(feature_type)
     
-    def _load_feature_kb(self) -> Dict:
+    def _load_feature_kb(self) -> _SharedKnowledgeBase:
         """Load feature roadmap knowledge base from JSON file"""
         try:
             kb_path = os.path.join("data", "feature_roadmap.json")
             if os.path.exists(kb_path):
-                with open(kb_path, 'r') as f:
-                    kb_data = json.load(f)
+                shared_kb = _load_kb_cached(kb_path, os.stat(kb_path).st_mtime)
                 logger.info("Feature roadmap knowledge base loaded successfully")
-                return kb_data
+                return shared_kb
             else:
                 logger.warning("Feature roadmap knowledge base file not found, using fallback data")
-                return self._get_fallback_kb()
         except Exception as e:
             logger.error(f"Failed to load feature roadmap knowledge base: {e}")
-            return self._get_fallback_kb()
+        
+        return _prepare_kb(self._get_fallback_kb())
     
     def _get_fallback_kb(self) -> Dict:
         """Fallback knowledge base when JSON file is not available"""
@@ -98,16 +277,18 @@ class FeatureRequestProcessor:
         if "competitor_analysis" in self.knowledge_base:
             competitor_analysis = self.knowledge_base["competitor_analysis"]
             if "competitors" in competitor_analysis:
-                # Convert competitor analysis to the expected format
+                # Convert competitor analysis to the expected format, with the competitors
+                # offering each feature grouped under one key
                 features = {}
                 for competitor_name, competitor_data in competitor_analysis["competitors"].items():
                     if "features_we_lack" in competitor_data:
                         for feature in competitor_data["features_we_lack"]:
-                            features[feature.lower().replace(" ", "_")] = {
+                            comparison = features.setdefault(feature.lower().replace(" ", "_"), {
                                 "our_platform": "Not available yet",
-                                competitor_name: "Available",
-                                "status": "planned"
-                            }
+                                "status": "planned",
+                                "competitors": {}
+                            })
+                            comparison["competitors"][competitor_name] = "Available"
                 return features
         return {}
     
@@ -153,6 +334,33 @@ class FeatureRequestProcessor:
         # Generate response using LLM
         llm_response = self._generate_llm_response(query, feature_type)
         
+        return self._build_response(llm_response, feature_type)
+    
+    def process_queries(self, queries: List[str], max_batch: int = 8) -> List[FeatureResponse]:
+        """Process many feature requests, answering up to max_batch requests of one type per LLM call"""
+        lowered = [query.lower() for query in queries]
+        feature_types = [self._identify_feature_type(query_lower) for query_lower in lowered]
+        answers: List[Optional[str]] = [None] * len(queries)
+        
+        # Requests of one type share the roadmap and competitor context, so they batch together
+        indices_by_type: Dict[str, List[int]] = {}
+        for i, (query_lower, feature_type) in enumerate(zip(lowered, feature_types)):
+            answers[i] = self._lookup_response((query_lower, feature_type))
+            if answers[i] is None:
+                indices_by_type.setdefault(feature_type, []).append(i)
+        
+        # Larger batches save calls but degrade per-answer quality, hence the cap
+        for feature_type, indices in indices_by_type.items():
+            for start in range(0, len(indices), max_batch):
+                chunk = indices[start:start + max_batch]
+                batch_answers = self._generate_batch_llm_response([queries[i] for i in chunk], feature_type)
+                for i, answer in zip(chunk, batch_answers):
+                    answers[i] = answer
+        
+        return [self._build_response(answer, feature_type) for answer, feature_type in zip(answers, feature_types)]
+    
+    def _build_response(self, llm_response: str, feature_type: str) -> FeatureResponse:
+        """Attach the roadmap, alternatives, voting and contact information to an answer"""
         # Get relevant roadmap and comparison information
         roadmap_info = self._get_roadmap_info(feature_type)
         alternatives = self._get_alternatives(feature_type)
@@ -167,49 +375,34 @@ class FeatureRequestProcessor:
     
     def _identify_feature_type(self, query: str) -> str:
         """Identify the type of feature being requested"""
-        for category, keywords in self.feature_categories.items():
-            if any(keyword in query for keyword in keywords):
+        return self._feature_type_cache(query)
+    
+    def _match_feature_type(self, query: str) -> str:
+        """Match a lowercased query against the keyword table"""
+        # One flat pass; the first keyword found decides, as table order is priority order
+        for keyword, category in self._keyword_table:
+            if keyword in query:
                 return category
-        
-        # Check for specific features
-        if any(word in query for word in ["dark mode", "theme", "color"]):
-            return "ui_ux"
-        elif any(word in query for word in ["export", "import", "backup"]):
-            return "integration"
-        elif any(word in query for word in ["notification", "alert", "email"]):
-            return "integration"
-        else:
-            return "general"
+        return "general"
     
     def _generate_llm_response(self, query: str, feature_type: str) -> str:
         """Generate LLM response for feature request"""
-        roadmap_context = self._get_roadmap_context(feature_type)
-        competitor_context = self._get_competitor_context(feature_type)
+        cache_key = (query.lower(), feature_type)
+        cached = self._lookup_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        # With nothing from the roadmap or competitors to reason over, the LLM would
+        # only paraphrase the canned answer
+        if not self._has_context(feature_type):
+            return self._get_fallback_response(feature_type)
+        
+        prompt = "".join((PROMPT_HEAD, 'Customer Query: "', query, '"', self._get_prompt_context(feature_type), PROMPT_TAIL))
         
-        prompt = f"""You are a product manager for a SaaS platform handling feature requests.
-
-Customer Query: "{query}"
-
-Feature Type: {feature_type}
-
-Roadmap Information:
-{roadmap_context}
-
-Competitor Comparison:
-{competitor_context}
-
-Provide a helpful, encouraging response that:
-1. Acknowledges the feature request
-2. Explains current status and timeline if applicable
-3. Mentions alternatives or workarounds
-4. Encourages voting on the feature request portal
-5. Is positive and shows we value customer input
-
-Keep the response friendly and informative."""
-
         try:
             response = self.llm.generate(prompt)
             if response and response.success:
+                self._store_response(cache_key, response.content)
                 return response.content
             else:
                 return self._get_fallback_response(feature_type)
@@ -217,217 +410,221 @@ Keep the response friendly and informative."""
             logger.error(f"LLM response generation failed: {e}")
             return self._get_fallback_response(feature_type)
     
+    def _generate_batch_llm_response(self, queries: List[str], feature_type: str) -> List[str]:
+        """Generate LLM responses for several feature requests of one type in a single call"""
+        if len(queries) == 1:
+            return [self._generate_llm_response(queries[0], feature_type)]
+        if not self._has_context(feature_type):
+            return [self._get_fallback_response(feature_type)] * len(queries)
+        
+        numbered = "\n".join(f'[{n}] "{query}"' for n, query in enumerate(queries, 1))
+        prompt = "".join((PROMPT_HEAD, "Customer Queries:\n", numbered, self._get_prompt_context(feature_type), BATCH_PROMPT_TAIL))
+        
+        try:
+            response = self.llm.generate(prompt)
+            if not response or not response.success:
+                return [self._get_fallback_response(feature_type)] * len(queries)
+            answers = parse_batch_answers(response.content, len(queries))
+        except Exception as e:
+            logger.error(f"Batch LLM response generation failed: {e}")
+            return [self._get_fallback_response(feature_type)] * len(queries)
+        
+        # Requests the batch reply skipped or garbled get their own call
+        results = []
+        for query, answer in zip(queries, answers):
+            if answer:
+                self._store_response((query.lower(), feature_type), answer)
+                results.append(answer)
+            else:
+                results.append(self._generate_llm_response(query, feature_type))
+        return results
+    
+    def _has_context(self, feature_type: str) -> bool:
+        """Check whether the roadmap or competitor analysis mentions the feature type"""
+        competitors, relevant_advantages = self._get_competitor_matches(feature_type)
+        return bool(competitors or relevant_advantages or any(self._get_roadmap_matches(feature_type).values()))
+    
+    def _get_prompt_context(self, feature_type: str) -> str:
+        """Get the feature type, roadmap and competitor section of the prompt, built once per type"""
+        context = self._prompt_context_by_type.get(feature_type)
+        if context is None:
+            context = "".join((
+                "\n\nFeature Type: ", feature_type,
+                "\n\nRoadmap Information:\n", self._get_roadmap_context(feature_type),
+                "\n\nCompetitor Comparison:\n", self._get_competitor_context(feature_type)
+            ))
+            self._prompt_context_by_type[feature_type] = context
+        return context
+    
+    def _lookup_response(self, cache_key: Tuple[str, str]) -> Optional[str]:
+        """Return the cached LLM answer for a (normalized query, feature type) key"""
+        with self._cache_lock:
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                self._response_cache.move_to_end(cache_key)
+            return cached
+    
+    def _store_response(self, cache_key: Tuple[str, str], content: str):
+        """Cache an LLM answer, evicting the least recently used one when full"""
+        with self._cache_lock:
+            self._response_cache[cache_key] = content
+            self._response_cache.move_to_end(cache_key)
+            if len(self._response_cache) > self.cache_size:
+                self._response_cache.popitem(last=False)
+    
+    def _get_roadmap_matches(self, feature_type: str) -> Dict[str, List[_RoadmapFeature]]:
+        """Roadmap features whose name or description mentions the feature type, by section"""
+        matches = self._roadmap_index.get(feature_type)
+        if matches is None:
+            matches = {
+                section: [
+                    feature for feature in features
+                    if feature_type in feature.name_lower or feature_type in feature.desc_lower
+                ]
+                for section, features in self._roadmap_features.items()
+            }
+            self._roadmap_index[feature_type] = matches
+        return matches
+    
+    def _get_competitor_matches(self, feature_type: str) -> Tuple[List[Tuple[str, List[str]]], List[str]]:
+        """Competitor features we lack and our advantages that mention the feature type"""
+        matches = self._competitor_index.get(feature_type)
+        if matches is None:
+            competitors = []
+            for competitor_name, features in self._competitor_gaps:
+                relevant_features = [feature for feature, feature_lower in features if feature_type in feature_lower]
+                if relevant_features:
+                    competitors.append((competitor_name, relevant_features))
+            
+            relevant_advantages = [adv for adv, adv_lower in self._our_advantages if feature_type in adv_lower]
+            
+            matches = (competitors, relevant_advantages[:2])
+            self._competitor_index[feature_type] = matches
+        return matches
+    
     def _get_roadmap_context(self, feature_type: str) -> str:
         """Get roadmap context for LLM from knowledge base"""
+        matches = self._get_roadmap_matches(feature_type)
         context = "Current Roadmap:\n"
         
-        if "roadmap" in self.knowledge_base:
-            roadmap = self.knowledge_base["roadmap"]
-            
-            # Check current quarter
-            if "current_quarter" in roadmap:
-                current = roadmap["current_quarter"]
-                
-                # In-progress features
-                if "in_progress" in current:
-                    relevant_features = []
-                    for feature in current["in_progress"]:
-                        if (feature_type in feature["feature"].lower() or 
-                            feature_type in feature.get("description", "").lower()):
-                            relevant_features.append(f"{feature['feature']} ({feature.get('progress', 'Unknown')}%)")
-                    
-                    if relevant_features:
-                        context += f"- Current Quarter (In Progress): {', '.join(relevant_features)}\n"
-                
-                # Planned features
-                if "planned" in current:
-                    relevant_features = []
-                    for feature in current["planned"]:
-                        if (feature_type in feature["feature"].lower() or 
-                            feature_type in feature.get("description", "").lower()):
-                            relevant_features.append(f"{feature['feature']} (ETA: {feature.get('eta', 'Unknown')})")
-                    
-                    if relevant_features:
-                        context += f"- Current Quarter (Planned): {', '.join(relevant_features)}\n"
-            
-            # Check next quarter
-            if "next_quarter" in roadmap:
-                next_q = roadmap["next_quarter"]
-                if "planned" in next_q:
-                    relevant_features = []
-                    for feature in next_q["planned"]:
-                        if (feature_type in feature["feature"].lower() or 
-                            feature_type in feature.get("description", "").lower()):
-                            relevant_features.append(f"{feature['feature']} (ETA: {feature.get('eta', 'Unknown')})")
-                    
-                    if relevant_features:
-                        context += f"- Next Quarter (Planned): {', '.join(relevant_features)}\n"
+        if matches["current_in_progress"]:
+            relevant_features = [f"{feature.name} ({feature.progress}%)" for feature in matches["current_in_progress"]]
+            context += f"- Current Quarter (In Progress): {', '.join(relevant_features)}\n"
+        
+        if matches["current_planned"]:
+            relevant_features = [f"{feature.name} (ETA: {feature.eta})" for feature in matches["current_planned"]]
+            context += f"- Current Quarter (Planned): {', '.join(relevant_features)}\n"
+        
+        if matches["next_planned"]:
+            relevant_features = [f"{feature.name} (ETA: {feature.eta})" for feature in matches["next_planned"]]
+            context += f"- Next Quarter (Planned): {', '.join(relevant_features)}\n"
         
         return context
     
     def _get_competitor_context(self, feature_type: str) -> str:
         """Get competitor context for LLM from knowledge base"""
+        competitors, relevant_advantages = self._get_competitor_matches(feature_type)
         context = "Feature Comparison:\n"
         
-        if "competitor_analysis" in self.knowledge_base:
-            competitor_analysis = self.knowledge_base["competitor_analysis"]
-            
-            if "competitors" in competitor_analysis:
-                for competitor_name, competitor_data in competitor_analysis["competitors"].items():
-                    # Check features we lack
-                    if "features_we_lack" in competitor_data:
-                        relevant_features = []
-                        for feature in competitor_data["features_we_lack"]:
-                            if feature_type in feature.lower():
-                                relevant_features.append(feature)
-                        
-                        if relevant_features:
-                            context += f"- {competitor_name}: Has {', '.join(relevant_features)}\n"
-            
-            # Add our advantages
-            if "market_positioning" in competitor_analysis and "our_advantages" in competitor_analysis["market_positioning"]:
-                advantages = competitor_analysis["market_positioning"]["our_advantages"]
-                relevant_advantages = [adv for adv in advantages if feature_type in adv.lower()]
-                if relevant_advantages:
-                    context += f"- Our advantages: {', '.join(relevant_advantages[:2])}\n"
+        for competitor_name, relevant_features in competitors:
+            context += f"- {competitor_name}: Has {', '.join(relevant_features)}\n"
+        
+        if relevant_advantages:
+            context += f"- Our advantages: {', '.join(relevant_advantages)}\n"
         
         return context
     
     def _get_fallback_response(self, feature_type: str) -> str:
         """Get fallback response when LLM fails"""
-        fallback_responses = {
-            "mobile": "Thank you for requesting mobile SDK features! We're actively working on mobile support and it's planned for Q4 2024. In the meantime, our web API works great on mobile browsers. Please vote for mobile features on our portal to help prioritize development.",
-            "analytics": "We appreciate your interest in advanced analytics! We're planning to enhance our analytics capabilities in Q2 2024. Currently, we offer basic analytics in our Pro plan. Please vote for analytics features to help us understand your specific needs.",
-            "integration": "Thanks for the integration request! We're continuously adding new integrations and webhook capabilities. Check our roadmap for upcoming features, and please vote for specific integrations you need.",
-            "security": "Security is a top priority for us. We're planning several security enhancements in Q3 2024. Please vote for security features and let us know your specific requirements.",
-            "ui_ux": "We're always working to improve our user interface and experience. Custom branding options are planned for Q3 2024. Please vote for UI/UX features to help us prioritize improvements.",
-            "general": "Thank you for your feature request! We value all customer feedback and use it to prioritize our development roadmap. Please visit our feature request portal to vote for this feature and see our current roadmap."
-        }
-        
-        return fallback_responses.get(feature_type, fallback_responses["general"])
+        return FALLBACK_RESPONSES.get(feature_type, FALLBACK_RESPONSES["general"])
     
-    def _get_roadmap_info(self, feature_type: str) -> Dict[str, any]:
+    def _get_roadmap_info(self, feature_type: str) -> Dict[str, Any]:
         """Get relevant roadmap information from knowledge base"""
+        roadmap_info = self._roadmap_info_by_type.get(feature_type)
+        if roadmap_info is None:
+            roadmap_info = self._build_roadmap_info(feature_type)
+            self._roadmap_info_by_type[feature_type] = roadmap_info
+        return roadmap_info
+    
+    def _build_roadmap_info(self, feature_type: str) -> Dict[str, Any]:
+        """Build the roadmap information shown for a feature type"""
+        matches = self._get_roadmap_matches(feature_type)
         relevant_roadmap = {}
         
-        if "roadmap" in self.knowledge_base:
-            roadmap = self.knowledge_base["roadmap"]
-            
-            # Check current quarter
-            if "current_quarter" in roadmap:
-                current = roadmap["current_quarter"]
-                relevant_features = []
-                
-                # In-progress features
-                if "in_progress" in current:
-                    for feature in current["in_progress"]:
-                        if (feature_type in feature["feature"].lower() or 
-                            feature_type in feature.get("description", "").lower()):
-                            relevant_features.append({
-                                "name": feature["feature"],
-                                "status": "In Progress",
-                                "progress": feature.get("progress", "Unknown"),
-                                "eta": feature.get("eta", "Unknown")
-                            })
-                
-                # Planned features
-                if "planned" in current:
-                    for feature in current["planned"]:
-                        if (feature_type in feature["feature"].lower() or 
-                            feature_type in feature.get("description", "").lower()):
-                            relevant_features.append({
-                                "name": feature["feature"],
-                                "status": "Planned",
-                                "eta": feature.get("eta", "Unknown")
-                            })
-                
-                if relevant_features:
-                    relevant_roadmap["current_quarter"] = {
-                        "title": "Current Quarter",
-                        "features": relevant_features
-                    }
-            
-            # Check next quarter
-            if "next_quarter" in roadmap:
-                next_q = roadmap["next_quarter"]
-                relevant_features = []
-                
-                if "planned" in next_q:
-                    for feature in next_q["planned"]:
-                        if (feature_type in feature["feature"].lower() or 
-                            feature_type in feature.get("description", "").lower()):
-                            relevant_features.append({
-                                "name": feature["feature"],
-                                "status": "Planned",
-                                "eta": feature.get("eta", "Unknown")
-                            })
-                
-                if relevant_features:
-                    relevant_roadmap["next_quarter"] = {
-                        "title": "Next Quarter",
-                        "features": relevant_features
-                    }
+        # Current quarter: in-progress features, then planned ones
+        relevant_features = [
+            {
+                "name": feature.name,
+                "status": "In Progress",
+                "progress": feature.progress,
+                "eta": feature.eta
+            }
+            for feature in matches["current_in_progress"]
+        ]
+        relevant_features.extend(
+            {
+                "name": feature.name,
+                "status": "Planned",
+                "eta": feature.eta
+            }
+            for feature in matches["current_planned"]
+        )
+        if relevant_features:
+            relevant_roadmap["current_quarter"] = {
+                "title": "Current Quarter",
+                "features": relevant_features
+            }
+        
+        # Next quarter
+        relevant_features = [
+            {
+                "name": feature.name,
+                "status": "Planned",
+                "eta": feature.eta
+            }
+            for feature in matches["next_planned"]
+        ]
+        if relevant_features:
+            relevant_roadmap["next_quarter"] = {
+                "title": "Next Quarter",
+                "features": relevant_features
+            }
         
         return relevant_roadmap
     
     def _get_alternatives(self, feature_type: str) -> List[str]:
         """Get alternative solutions or workarounds"""
-        alternatives = {
-            "mobile": [
-                "Use our responsive web API in mobile browsers",
-                "Integrate with our REST API in native apps",
-                "Use third-party mobile SDK wrappers"
-            ],
-            "analytics": [
-                "Export data and analyze in external tools",
-                "Use our basic analytics in Pro plan",
-                "Set up custom tracking with webhooks"
-            ],
-            "integration": [
-                "Use our webhook system for real-time updates",
-                "Set up scheduled API calls for data sync",
-                "Use our REST API for custom integrations"
-            ],
-            "security": [
-                "Use API key authentication",
-                "Implement IP whitelisting",
-                "Set up audit logging"
-            ],
-            "ui_ux": [
-                "Use our current interface with custom CSS",
-                "Integrate our API into your own UI",
-                "Use our webhook system for custom notifications"
-            ]
-        }
-        
-        return alternatives.get(feature_type, ["Check our documentation for current capabilities", "Contact our sales team for custom solutions"])
+        return ALTERNATIVES.get(feature_type, DEFAULT_ALTERNATIVES)
     
     def get_feature_status(self, feature_name: str) -> Dict[str, str]:
         """Get status of a specific feature"""
         feature_lower = feature_name.lower()
         
         # Check roadmap
-        for quarter, data in self.roadmap.items():
-            for feature in data["features"]:
-                if feature_lower in feature.lower():
+        for section, quarter, status in ROADMAP_SECTIONS:
+            for feature in self._roadmap_features[section]:
+                if feature_lower in feature.name_lower:
                     return {
-                        "status": data["status"],
-                        "timeline": data["completion"],
+                        "status": status,
+                        "timeline": feature.eta,
+                        "progress": feature.progress,
                         "quarter": quarter
                     }
         
         # Check competitor comparison
+        # Keys are lowercased and underscore-joined by _extract_competitor_features
+        feature_key = feature_lower.replace(" ", "_")
         for feature, comparison in self.competitor_features.items():
-            if feature_lower in feature.lower():
+            if feature_key in feature:
                 return {
                     "status": comparison["status"],
                     "our_platform": comparison["our_platform"],
-                    "competitors": {k: v for k, v in comparison.items() if k.startswith("competitor")}
+                    "competitors": comparison["competitors"]
                 }
         
         return {"status": "not_planned", "message": "Feature not currently planned"}
     
-    def get_roadmap_summary(self) -> Dict[str, any]:
+    def get_roadmap_summary(self) -> Dict[str, Any]:
         """Get summary of current roadmap"""
         summary = {
             "quarters": {},
@@ -436,46 +633,55 @@ Keep the response friendly and informative."""
             "planned": 0
         }
         
-        for quarter, data in self.roadmap.items():
-            summary["quarters"][quarter] = {
-                "title": data["title"],
-                "feature_count": len(data["features"]),
-                "status": data["status"],
-                "completion": data["completion"]
-            }
-            summary["total_features"] += len(data["features"])
+        for section, quarter, status in ROADMAP_SECTIONS:
+            feature_count = len(self._roadmap_features[section])
+            quarter_summary = summary["quarters"].setdefault(
+                quarter, {"feature_count": 0, "in_progress": 0, "planned": 0}
+            )
+            quarter_summary["feature_count"] += feature_count
+            quarter_summary[status] += feature_count
             
-            if data["status"] == "in_progress":
-                summary["in_progress"] += len(data["features"])
-            elif data["status"] == "planned":
-                summary["planned"] += len(data["features"])
+            summary["total_features"] += feature_count
+            summary[status] += feature_count
         
         return summary
     
     def format_response(self, response: FeatureResponse) -> str:
         """Format feature request response for display"""
-        formatted = f"{response.response}\n\n"
+        parts = [response.response, "\n\n"]
         
         if response.roadmap_info:
-            formatted += "**Roadmap Information:**\n"
-            for quarter, data in response.roadmap_info.items():
-                formatted += f"- {data['title']} ({data['status']}): {', '.join(data['features'])}\n"
-            formatted += "\n"
+            parts.append("**Roadmap Information:**\n")
+            for data in response.roadmap_info.values():
+                features = ", ".join(f"{feature['name']} ({feature['status']}, ETA: {feature['eta']})" for feature in data["features"])
+                parts.append(f"- {data['title']}: {features}\n")
+            parts.append("\n")
         
         if response.alternatives:
-            formatted += "**Current Alternatives:**\n"
-            for i, alternative in enumerate(response.alternatives, 1):
-                formatted += f"{i}. {alternative}\n"
-            formatted += "\n"
-        
-        formatted += "**Feature Voting:**\n"
-        formatted += f"- Portal: {response.voting_info['how_to_vote']}\n"
-        formatted += f"- Current top requests: {', '.join(response.voting_info['current_top_requests'][:3])}\n"
-        formatted += f"- Voting deadline: {response.voting_info['voting_deadline']}\n\n"
-        
-        formatted += "**Contact Information:**\n"
-        formatted += f"- Product Team: {response.contact_info['product_team']}\n"
-        formatted += f"- Feature Portal: {response.contact_info['feature_portal']}\n"
-        formatted += f"- Community Forum: {response.contact_info['community_forum']}\n"
-        
-        return formatted 
\ No newline at end of file
+            parts.append("**Current Alternatives:**\n")
+            parts.extend(f"{i}. {alternative}\n" for i, alternative in enumerate(response.alternatives, 1))
+            parts.append("\n")
+        
+        voting_info = response.voting_info
+        parts.append("**Feature Voting:**\n")
+        parts.append(f"- Portal: {voting_info['how_to_vote']}\n")
+        parts.append(f"- Current top requests: {', '.join(voting_info['current_top_requests'][:3])}\n")
+        parts.append(f"- Voting deadline: {voting_info['voting_deadline']}\n\n")
+        
+        # Responses built by this processor share its contact info, rendered once
+        if response.contact_info is self.contact_info:
+            parts.append(self._contact_block)
+        else:
+            parts.append(self._render_contact_block(response.contact_info))
+        
+        return "".join(parts)
+    
+    @staticmethod
+    def _render_contact_block(contact_info: Dict[str, str]) -> str:
+        """Render the contact information section of a formatted response"""
+        return (
+            "**Contact Information:**\n"
+            f"- Product Team: {contact_info['product_team']}\n"
+            f"- Feature Portal: {contact_info['feature_portal']}\n"
+            f"- Community Forum: {contact_info['community_forum']}\n"
+        )
\ No newline at end of file
@@ -3,16 +3,23 @@ Main Customer Support System
 Integrates LLM wrapper, intent detection, and specialized processors
 """
 
+import asyncio
 import logging
+import os
 import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
+from threading import Lock
 from llm_wrapper import LLMWrapper, LLMResponse
 from intent_detector import IntentDetector, IntentResult
-from processors import TechnicalProcessor, BillingProcessor, FeatureRequestProcessor
+from processors import TechnicalProcessor, FeatureRequestProcessor
+from processors.billing import get_billing_processor
 
 logger = logging.getLogger(__name__)
 
+# Answer returned when processing a query fails outright
+ERROR_RESPONSE = "I apologize, but I encountered an error while processing your request. Please try again or contact our support team for assistance."
+
 @dataclass
 class SupportResponse:
     """Complete support response with all metadata"""
@@ -29,16 +36,17 @@ class SupportResponse:
 class CustomerSupportSystem:
     """Main customer support system with intent detection and specialized processing"""
     
-    def __init__(self):
-        # Initialize LLM wrapper
-        self.llm_wrapper = LLMWrapper()
+    def __init__(self, quant: Optional[str] = None):
+        # Initialize LLM wrapper, optionally on a quantized build of the local model
+        self.quant = quant
+        self.llm_wrapper = LLMWrapper(local_model=self._resolve_local_model(quant))
         
         # Initialize intent detector
         self.intent_detector = IntentDetector(self.llm_wrapper)
         
         # Initialize specialized processors
         self.technical_processor = TechnicalProcessor(self.llm_wrapper)
-        self.billing_processor = BillingProcessor(self.llm_wrapper)
+        self.billing_processor = get_billing_processor(self.llm_wrapper)
         self.feature_processor = FeatureRequestProcessor(self.llm_wrapper)
         
         # Processor mapping
@@ -56,9 +64,21 @@ class CustomerSupportSystem:
             "total_tokens": 0,
             "success_rate": 0.0
         }
+        self._stats_lock = Lock()
         
         logger.info("Customer Support System initialized successfully")
     
+    @staticmethod
+    def _resolve_local_model(quant: Optional[str]) -> Optional[str]:
+        """Look up the Ollama model tag configured for a quantization mode"""
+        if not quant:
+            return None
+        
+        model = os.getenv(f"LOCAL_MODEL_NAME_{quant.upper()}")
+        if not model:
+            logger.warning(f"LOCAL_MODEL_NAME_{quant.upper()} not set, using the default local model for quant={quant}")
+        return model
+    
     def process_query(self, query: str, context: Optional[Dict] = None) -> SupportResponse:
         """Process a customer query end-to-end"""
         start_time = time.time()
@@ -123,7 +143,7 @@ class CustomerSupportSystem:
                     keywords=[],
                     reasoning="Error occurred during processing"
                 ),
-                response="I apologize, but I encountered an error while processing your request. Please try again or contact our support team for assistance.",
+                response=ERROR_RESPONSE,
                 processor_used="error",
                 model_used="none",
                 response_time=time.time() - start_time,
@@ -145,43 +165,70 @@ class CustomerSupportSystem:
             # Step 2: Generate LLM response with intent context
             strategy = self.intent_detector.get_processing_strategy(intent_result.intent)
             
-            prompt = self._build_llm_prompt(query, intent_result, strategy)
-            llm_response = self.llm_wrapper.generate(prompt)
+            system_prompt = self._build_llm_prompt(intent_result, strategy)
+            llm_response = self.llm_wrapper.generate(f'Customer Query: "{query}"', system_prompt=system_prompt)
             
             if not llm_response or not llm_response.success:
                 # Fallback to processor-based approach
                 return self.process_query(query, context)
             
-            # Step 3: Update statistics
-            response_time = time.time() - start_time
-            self._update_stats(intent_result.intent, response_time, llm_response.tokens_used)
+            return self._build_llm_support_response(query, intent_result, strategy, llm_response, start_time)
             
-            # Step 4: Create response object
-            support_response = SupportResponse(
-                query=query,
-                intent=intent_result,
-                response=llm_response.content,
-                processor_used=f"llm_{intent_result.intent}",
-                model_used=llm_response.model_used,
-                response_time=response_time,
-                tokens_used=llm_response.tokens_used,
-                confidence=intent_result.confidence,
-                metadata={
-                    "keywords": intent_result.keywords,
-                    "reasoning": intent_result.reasoning,
-                    "strategy": strategy
-                }
-            )
+        except Exception as e:
+            logger.error(f"Error in LLM processing: {e}")
+            return self.process_query(query, context)  # Fallback to processor approach
+    
+    async def aprocess_query_with_llm(self, query: str, context: Optional[Dict] = None) -> SupportResponse:
+        """Async variant of process_query_with_llm for concurrent direct-LLM requests"""
+        start_time = time.time()
+        
+        try:
+            intent_result = await self.intent_detector.aclassify_intent(query)
+            strategy = self.intent_detector.get_processing_strategy(intent_result.intent)
             
-            logger.info(f"LLM query processed: {intent_result.intent} using {llm_response.model_used}")
-            return support_response
+            system_prompt = self._build_llm_prompt(intent_result, strategy)
+            llm_response = await self.llm_wrapper.agenerate(f'Customer Query: "{query}"', system_prompt=system_prompt)
+            
+            if not llm_response or not llm_response.success:
+                return await asyncio.to_thread(self.process_query, query, context)
+            
+            return self._build_llm_support_response(query, intent_result, strategy, llm_response, start_time)
             
         except Exception as e:
             logger.error(f"Error in LLM processing: {e}")
-            return self.process_query(query, context)  # Fallback to processor approach
+            return await asyncio.to_thread(self.process_query, query, context)
+    
+    def _build_llm_support_response(self, query: str, intent_result: IntentResult, strategy: Dict[str, str],
+                                    llm_response: LLMResponse, start_time: float) -> SupportResponse:
+        """Record statistics and wrap a successful direct-LLM answer"""
+        response_time = time.time() - start_time
+        self._update_stats(intent_result.intent, response_time, llm_response.tokens_used)
+        
+        support_response = SupportResponse(
+            query=query,
+            intent=intent_result,
+            response=llm_response.content,
+            processor_used=f"llm_{intent_result.intent}",
+            model_used=llm_response.model_used,
+            response_time=response_time,
+            tokens_used=llm_response.tokens_used,
+            confidence=intent_result.confidence,
+            metadata={
+                "keywords": intent_result.keywords,
+                "reasoning": intent_result.reasoning,
+                "strategy": strategy
+            }
+        )
+        
+        logger.info(f"LLM query processed: {intent_result.intent} using {llm_response.model_used}")
+        return support_response
     
-    def _build_llm_prompt(self, query: str, intent_result: IntentResult, strategy: Dict[str, str]) -> str:
-        """Build LLM prompt based on intent and strategy with knowledge base context"""
+    def _build_llm_prompt(self, intent_result: IntentResult, strategy: Dict[str, str]) -> str:
+        """Build the static system prompt for an intent with knowledge base context.
+        
+        The customer query is sent separately as the user message, so this prefix
+        stays byte-identical across queries and can be served from prompt caches.
+        """
         
         # Get knowledge base context for the intent
         kb_context = self._get_knowledge_base_context(intent_result.intent)
@@ -189,12 +236,10 @@ class CustomerSupportSystem:
         base_prompts = {
             "technical": f"""You are a technical support specialist for a SaaS API platform.
 
-Customer Query: "{query}"
-
 Knowledge Base Context:
 {kb_context}
 
-Provide a helpful, step-by-step solution that includes:
+Provide a helpful, step-by-step solution to the customer query that includes:
 1. Clear explanation of the issue
 2. Step-by-step resolution
 3. Code examples if applicable
@@ -204,12 +249,10 @@ Keep the response concise but comprehensive. Focus on practical solutions.""",
             
             "billing": f"""You are a billing support specialist for a SaaS platform.
 
-Customer Query: "{query}"
-
 Knowledge Base Context:
 {kb_context}
 
-Provide a helpful, clear response that:
+Provide a helpful, clear response to the customer query that:
 1. Directly addresses the customer's question
 2. Includes relevant pricing information if applicable
 3. Explains any policies or procedures
@@ -220,12 +263,10 @@ Keep the response concise but informative.""",
             
             "feature": f"""You are a product manager for a SaaS platform handling feature requests.
 
-Customer Query: "{query}"
-
 Knowledge Base Context:
 {kb_context}
 
-Provide a helpful, encouraging response that:
+Provide a helpful, encouraging response to the customer query that:
 1. Acknowledges the feature request
 2. Explains current status and timeline if applicable
 3. Mentions alternatives or workarounds
@@ -235,8 +276,7 @@ Provide a helpful, encouraging response that:
 Keep the response friendly and informative."""
         }
         
-        base_prompt = base_prompts.get(intent_result.intent, base_prompts["technical"])
-        return base_prompt.format(query=query)
+        return base_prompts.get(intent_result.intent, base_prompts["technical"])
     
     def _get_knowledge_base_context(self, intent: str) -> str:
         """Get relevant knowledge base context for the intent"""
@@ -287,20 +327,21 @@ Keep the response friendly and informative."""
     
     def _update_stats(self, intent: str, response_time: float, tokens: int):
         """Update system statistics"""
-        self.stats["total_queries"] += 1
-        self.stats["intent_distribution"][intent] += 1
-        self.stats["total_tokens"] += tokens
-        
-        # Update average response time
-        current_avg = self.stats["avg_response_time"]
-        total_queries = self.stats["total_queries"]
-        self.stats["avg_response_time"] = (current_avg * (total_queries - 1) + response_time) / total_queries
-        
-        # Update success rate (simplified)
-        if response_time < 30:  # Consider under 30 seconds as success
-            self.stats["success_rate"] = (self.stats["success_rate"] * (total_queries - 1) + 1) / total_queries
-        else:
-            self.stats["success_rate"] = (self.stats["success_rate"] * (total_queries - 1)) / total_queries
+        with self._stats_lock:
+            self.stats["total_queries"] += 1
+            self.stats["intent_distribution"][intent] += 1
+            self.stats["total_tokens"] += tokens
+            
+            # Update average response time
+            current_avg = self.stats["avg_response_time"]
+            total_queries = self.stats["total_queries"]
+            self.stats["avg_response_time"] = (current_avg * (total_queries - 1) + response_time) / total_queries
+            
+            # Update success rate (simplified)
+            if response_time < 30:  # Consider under 30 seconds as success
+                self.stats["success_rate"] = (self.stats["success_rate"] * (total_queries - 1) + 1) / total_queries
+            else:
+                self.stats["success_rate"] = (self.stats["success_rate"] * (total_queries - 1)) / total_queries
     
     def get_system_stats(self) -> Dict[str, Any]:
         """Get comprehensive system statistics"""